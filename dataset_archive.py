@@ -0,0 +1,264 @@
+import os
+import sys
+import json
+import mmap
+import struct
+import graph
+import graph_binary
+
+# an archive holds many graphs, matchings and statistics as records,
+# all integers are little endian, and every record starts at a multiple of 8
+# header: magic, version
+# record: magic, length of kind, length of name, size of data, followed by
+#         kind and name in UTF-8, and the data, each padded to a multiple of 8
+# the records are followed by the index, a JSON list of [kind, name, offset
+# of the data, size of the data], and the trailer: offset of the index, magic
+# the index is rewritten after the records appended, if it is missing, as
+# when a writer did not finish, it is rebuilt by scanning the records
+MAGIC = b'HRA\0'
+VERSION = 1
+INDEX_MAGIC = b'HRAI'
+RECORD_MAGIC = b'REC\0'
+header = struct.Struct('<4sI')
+record_header = struct.Struct('<4sIIQ')
+trailer = struct.Struct('<Q4s')
+
+# kinds of records
+GRAPH, MATCHING, STATS = 'graph', 'matching', 'stats'
+
+
+def align(pos):
+    return (pos + 7) & ~7
+
+
+class DatasetArchive:
+    """
+    archive of the graphs in a dataset with their matchings and statistics,
+    the records are looked up by (kind, name), the names are paths relative
+    to the dataset directory, such as 'shuffle/n1_1000/S_g1.txt'
+    """
+    def __init__(self, file_path, mode='r'):
+        """
+        :param file_path: path to the archive
+        :param mode: 'r' to read, 'a' to read and append, the archive is
+                     created if it does not exist
+        """
+        if mode not in ('r', 'a'):
+            raise ValueError('invalid mode {}'.format(mode))
+        self.file_path, self.mode = file_path, mode
+        if mode == 'a' and not os.path.isfile(file_path):
+            with open(file_path, mode='wb') as fout:
+                fout.write(header.pack(MAGIC, VERSION))
+        self.f = open(file_path, mode='r+b' if mode == 'a' else 'rb')
+        mm = mmap.mmap(self.f.fileno(), 0, access=mmap.ACCESS_READ) \
+            if os.fstat(self.f.fileno()).st_size else None
+        self.buf = memoryview(mm) if mm else b''
+        self.index, end = self.read_index()
+        if mode == 'a':
+            # the index is written again on close
+            self.buf = None
+            if mm: mm.close()
+            self.f.truncate(end)
+            self.f.seek(end)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def read_index(self):
+        """
+        :return: dict (kind, name) -> (offset, size) of the data, and the end of the records
+        """
+        buf = self.buf
+        if len(buf) < header.size or bytes(buf[:len(MAGIC)]) != MAGIC:
+            raise ValueError('{}: not a dataset archive'.format(self.file_path))
+        _, version = header.unpack_from(buf)
+        if version != VERSION:
+            raise ValueError('{}: unsupported dataset archive version {}'.format(self.file_path, version))
+
+        if len(buf) >= header.size + trailer.size:
+            offset, magic = trailer.unpack_from(buf, len(buf) - trailer.size)
+            if magic == INDEX_MAGIC and header.size <= offset <= len(buf) - trailer.size:
+                entries = json.loads(str(buf[offset:len(buf) - trailer.size], 'utf-8'))
+                return dict(((kind, name), (pos, size)) for kind, name, pos, size in entries), offset
+
+        # scan the records
+        index, pos = {}, header.size
+        while pos + record_header.size <= len(buf):
+            magic, kind_len, name_len, size = record_header.unpack_from(buf, pos)
+            if magic != RECORD_MAGIC: break
+            start = pos + record_header.size
+            data = align(start + kind_len + name_len)
+            if data + size > len(buf): break
+            kind = str(buf[start:start + kind_len], 'utf-8')
+            name = str(buf[start + kind_len:start + kind_len + name_len], 'utf-8')
+            index.pop((kind, name), None)
+            index[(kind, name)] = (data, size)
+            pos = align(data + size)
+        return index, pos
+
+    def close(self):
+        if self.f.closed: return
+        if self.mode == 'a':
+            offset = self.f.tell()
+            entries = [[kind, name, pos, size] for (kind, name), (pos, size) in self.index.items()]
+            self.f.write(json.dumps(entries).encode('utf-8'))
+            self.f.write(trailer.pack(offset, INDEX_MAGIC))
+        # the graphs read may still refer to the mapped file, so it is not closed here
+        self.buf = None
+        self.f.close()
+
+    def __len__(self):
+        return len(self.index)
+
+    def __contains__(self, key):
+        return key in self.index
+
+    def names(self, kind):
+        """
+        :param kind: kind of the records
+        :return: names of the records of the kind, in the order they were added
+        """
+        return [name for kind_, name in self.index if kind_ == kind]
+
+    def add(self, kind, name, data):
+        """
+        appends a record, replacing the record with the same kind and name
+        :param kind: kind of the record
+        :param name: name of the record
+        :param data: bytes
+        :return: None
+        """
+        if self.mode != 'a':
+            raise ValueError('{}: archive is not open for appending'.format(self.file_path))
+        kind_, name_ = kind.encode('utf-8'), name.encode('utf-8')
+        pos = self.f.tell()
+        start = pos + record_header.size
+        data_pos = align(start + len(kind_) + len(name_))
+        self.f.write(record_header.pack(RECORD_MAGIC, len(kind_), len(name_), len(data)))
+        self.f.write(kind_ + name_ + bytes(data_pos - start - len(kind_) - len(name_)))
+        self.f.write(data)
+        self.f.write(bytes(align(len(data)) - len(data)))
+        self.index.pop((kind, name), None)
+        self.index[(kind, name)] = (data_pos, len(data))
+
+    def locate(self, kind, name):
+        """
+        :param kind: kind of the record
+        :param name: name of the record
+        :return: offset and size of the data of the record, see read_record,
+                 None if there is no such record
+        """
+        return self.index.get((kind, name))
+
+    def read(self, kind, name):
+        """
+        :param kind: kind of the record
+        :param name: name of the record
+        :return: data of the record, a view on the mapped archive when reading
+        """
+        record = self.locate(kind, name)
+        if record is None:
+            raise KeyError('{}: no {} record {}'.format(self.file_path, kind, name))
+        pos, size = record
+        if self.buf is not None:
+            return self.buf[pos:pos + size]
+        self.f.flush()
+        return read_record(self.file_path, pos, size)
+
+    def add_graph(self, name, G):
+        """
+        :param name: name of the graph
+        :param G: bipartite graph or compact graph, stored in the binary format
+        """
+        self.add(GRAPH, name, b''.join(graph_binary.binary_graph_chunks(G)))
+
+    def graph(self, name, compact=False):
+        """
+        :param name: name of the graph
+        :param compact: return a compact graph instead of a bipartite graph
+        :return: graph, see graph_binary.from_buffer
+        """
+        C = graph_binary.from_buffer(self.read(GRAPH, name), '{}:{}'.format(self.file_path, name))
+        return C if compact else graph.from_compact_graph(C)
+
+    def add_matching(self, name, G, M):
+        """
+        :param name: name of the matching
+        :param G: graph the matching is for
+        :param M: matching in G, stored in the binary format, see matching_binary
+        """
+        import matching_binary
+        self.add(MATCHING, name, matching_binary.to_bytes(G, M))
+
+    def matching(self, name, G=None):
+        """
+        :param name: name of the matching
+        :param G: graph the matching is for, see sea.parse_matching
+        :return: matching
+        """
+        import sea
+        return sea.parse_matching(self.read(MATCHING, name), G, '{}:{}'.format(self.file_path, name))
+
+    def add_stats(self, name, s):
+        self.add(STATS, name, s.encode('utf-8'))
+
+    def stats(self, name):
+        return str(self.read(STATS, name), 'utf-8')
+
+
+def read_record(file_path, pos, size):
+    """
+    reads the data of a record without reading the index, so that the jobs
+    given the records located in the index once do not read it again
+    :param file_path: path to the archive
+    :param pos: offset of the data, see DatasetArchive.locate
+    :param size: size of the data
+    :return: data of the record
+    """
+    with open(file_path, mode='rb') as fin:
+        fin.seek(pos)
+        return memoryview(fin.read(size))
+
+
+def pack_directory(dirpath, archive_path, kind_fn):
+    """
+    appends the files in dirpath, recursively, to the archive, the graphs
+    are parsed and stored in the binary format, the other files as they are
+    :param dirpath: dataset directory
+    :param archive_path: path to the archive
+    :param kind_fn: function taking the name of a file, and returning the kind
+                    of the record for it, None if the file should be skipped
+    :return: None
+    """
+    import graph_parser
+    with DatasetArchive(archive_path, mode='a') as archive:
+        for root, dirs, files in os.walk(dirpath):
+            dirs.sort()
+            for filename in sorted(files):
+                path = os.path.join(root, filename)
+                name = os.path.relpath(path, dirpath).replace(os.sep, '/')
+                kind = kind_fn(filename)
+                if kind == GRAPH:
+                    archive.add_graph(name, graph_parser.read_graph(path, compact=True))
+                elif kind is not None:
+                    with open(path, mode='rb') as fin:
+                        archive.add(kind, name, fin.read())
+
+
+def main():
+    import jea_exp
+    if len(sys.argv) == 4 and sys.argv[1] == 'pack':
+        pack_directory(sys.argv[2], sys.argv[3], jea_exp.archive_kind)
+    elif len(sys.argv) == 3 and sys.argv[1] == 'list':
+        with DatasetArchive(sys.argv[2]) as archive:
+            for (kind, name), (_, size) in archive.index.items():
+                print(kind, name, size)
+    else:
+        print('usage: {0} pack <dataset dir> <archive>\n       {0} list <archive>'.format(sys.argv[0]),
+              file=sys.stderr)
+
+if __name__ == '__main__':
+    main()
@@ -4,18 +4,28 @@ import graph
 import generate_instance
 
 
-def generate_dataset(output_dir):
+def generate_dataset(output_dir, archive=None):
+    """
+    :param output_dir: directory to write the graphs to
+    :param archive: dataset_archive.DatasetArchive to add the graphs to instead
+    """
     for iteration in range(1, 11, 1):
         n1, n2, k, cap = 2000, 20, 5, 10
         file_path = os.path.join(output_dir, '{}_{}_{}_{}_{}.txt'.format(n1, n2, k, cap, iteration))
         G = generate_instance.mahadian_model_generator(n1, n2, k, cap)
-        with open(os.path.join(output_dir, file_path), encoding='utf-8', mode='w') as out:
-            out.write(graph.graph_to_UTF8_string(G))
+        if archive is not None:
+            archive.add_graph(os.path.basename(file_path), G)
+        else:
+            graph.write_graph_file(G, os.path.join(output_dir, file_path))
 
 
 def main():
     if len(sys.argv) < 2:
-        print('usage: {} <output-dir>'. format(sys.argv[0]))
+        print('usage: {} <output-dir or archive.hra>'. format(sys.argv[0]))
+    elif sys.argv[1].endswith('.hra'):
+        import dataset_archive
+        with dataset_archive.DatasetArchive(sys.argv[1], mode='a') as archive:
+            generate_dataset('', archive)
     else:
         output_dir = sys.argv[1]
         generate_dataset(output_dir)
@@ -1,10 +1,44 @@
 import graph
 import collections
 import random
-import numpy as np
 
 
-def random_model_generator(n1, n2, k, cap):
+def sample_preference_lists(rng, n, m, k, chunk_size=1 << 22):
+    """
+    samples k of the m vertices in the other partition, in random order,
+    for each of n vertices, when k is small compared to m, the lists are drawn
+    with replacement and those with a repeated vertex are drawn again, otherwise
+    every pair gets a random key and the k smallest keys of each row are kept
+    :param rng: numpy random generator
+    :param n: number of vertices
+    :param m: number of vertices in the other partition
+    :param k: length of the preference lists, at most m
+    :param chunk_size: number of keys drawn at a time
+    :return: n x k array, row u is the preference list of u
+    """
+    import numpy as np
+    if k * k <= m:
+        # a list has a repeated vertex with probability below 1/2
+        prefs = rng.integers(0, m, size=(n, k), dtype=np.int32)
+        redraw = np.arange(n)
+        while len(redraw):
+            s = np.sort(prefs[redraw], axis=1)
+            redraw = redraw[(s[:, 1:] == s[:, :-1]).any(axis=1)]
+            prefs[redraw] = rng.integers(0, m, size=(len(redraw), k), dtype=np.int32)
+        return prefs
+
+    prefs = np.empty((n, k), dtype=np.int32)
+    rows = max(1, chunk_size // m)
+    for start in range(0, n, rows):
+        keys = rng.random((min(rows, n - start), m), dtype=np.float32)
+        part = np.argpartition(keys, k - 1, axis=1)[:, :k] if k < m else np.arange(m)[None, :].repeat(len(keys), 0)
+        # order the sampled vertices by their keys
+        order = np.argsort(np.take_along_axis(keys, part, axis=1), axis=1)
+        prefs[start:start + len(keys)] = np.take_along_axis(part, order, axis=1)
+    return prefs
+
+
+def random_model_generator(n1, n2, k, cap, compact=False, seed=None):
     """
     create a graph with the partition A of size n1
     and partition B of size n2 using the random model
@@ -12,45 +46,47 @@ def random_model_generator(n1, n2, k, cap):
     :param n2: size of partition B
     :param k: length of preference list for vertices in A
     :param cap: capacity of a vertex in partition B
+    :param compact: return a compact graph instead of a bipartite graph
+    :param seed: seed for the random generator, None for a random seed
     :return: bipartite graph with above properties
     """
-    def order_by_master_list(l, master_list):
-        return sorted(l, key=master_list.index)
+    import array
+    import numpy as np
+    rng = np.random.default_rng(seed)
 
-    # create the sets R and H, r_1 ... r_n1, h_1 .. h_n2
-    R = set('r{}'.format(i) for i in range(1, n1+1))
-    H = set('h{}'.format(i) for i in range(1, n2+1))
-
-    # prepare a master list
-    # master_list = list(h for h in H)
-    # random.shuffle(master_list)
+    # the residents r_1 ... r_n1 and hospitals h_1 .. h_n2, numbered by their
+    # position in sorted order as in graph.make_compact_graph
+    R = sorted('r{}'.format(i) for i in range(1, n1+1))
+    H = sorted('h{}'.format(i) for i in range(1, n2+1))
+    k = min(n2, k)
 
-    # setup the capacities for the vertices
-    capacities = dict((r, (0, 1)) for r in R)
-    #capacities.update(dict((h, 1) for h in H))
-    capacities.update(dict((h, (0, cap)) for h in H))
+    # the preference lists of the residents, as edges grouped by resident
+    hos = sample_preference_lists(rng, n1, n2, k).ravel() if k > 0 else np.empty(0, dtype=np.int32)
+    res = np.repeat(np.arange(n1, dtype=np.int32), k)
 
-    pref_lists_H, pref_lists_R = collections.defaultdict(list), {}
-    for resident in R:
-        pref_list = random.sample(H, min(len(H), k))  # random.randint(1, len(H)))  # sample houses
-        pref_lists_R[resident] = pref_list  # order_by_master_list(pref_list, master_list)
-        # add these residents to the preference list for the corresponding hospital
-        for hospital in pref_list:
-            pref_lists_H[hospital].append(resident)
+    # the residents in random order, grouped by hospital by a stable sort
+    shuffled = rng.permutation(len(hos))
+    by_hospital = shuffled[np.argsort(hos[shuffled], kind='stable')]
 
-    for hospital in H:
-        random.shuffle(pref_lists_H[hospital])
+    # only keep those hospitals which are in some residents preference list
+    degree = np.bincount(hos, minlength=n2)
+    kept = degree > 0
+    ids = np.cumsum(kept) - 1
+    H_ = [h for h, keep in zip(H, kept.tolist()) if keep]
 
-    # create a dict with the preference lists for residents and hospitals
-    E = pref_lists_R
-    E.update(pref_lists_H)
+    def partition(names, offsets, prefs, upper):
+        return graph.Partition(names, array.array('i', bytes(len(names) * 4)),
+                               array.array('i', np.full(len(names), upper, dtype=np.int32).tobytes()),
+                               array.array('q', offsets.astype(np.int64).tobytes()),
+                               array.array('i', prefs.astype(np.int32).tobytes()))
 
-    # only keep those hospitals which are in some residents preference list
-    H_ = set(hospital for hospital in H if hospital in E)
-    return graph.BipartiteGraph(R, H_, E, capacities)
+    C = graph.CompactGraph(
+        partition(R, np.arange(n1 + 1) * k, ids[hos], 1),
+        partition(H_, np.concatenate(([0], np.cumsum(degree[kept]))), res[by_hospital], cap))
+    return C if compact else graph.from_compact_graph(C)
 
 
-def mahadian_shuffle_model_generator(n1, n2, k, cap, master_model=True):
+def mahadian_shuffle_model_generator(n1, n2, k, cap, master_model=True, compact=False):
     """
     create a graph with the partition R of size n1 and
     partition H of size n2 using the model as described in
@@ -61,8 +97,10 @@ def mahadian_shuffle_model_generator(n1, n2, k, cap, master_model=True):
     :param n2: size of partition H
     :param k: length of preference list for the residents
     :param cap: capacity of the hospitals
+    :param compact: return a compact graph instead of a bipartite graph
     :return: bipartite graph with above properties
     """
+    import numpy as np
     def order_by_master_list(l, master_list):
         return sorted(l, key=master_list.index)
 
@@ -110,6 +148,9 @@ def mahadian_shuffle_model_generator(n1, n2, k, cap, master_model=True):
 
     # only keep those hospitals which are in some resident's preference list
     H_ = set(h for h in H if h in E)
+    if compact:
+        return graph.make_compact_graph(R, H_, ((r, E[r]) for r in R),
+                                        ((h, E[h]) for h in H_), capacities)
     return graph.BipartiteGraph(R, H_, E, capacities)
 
 
@@ -122,8 +163,7 @@ def main():
         output_path = sys.argv[5]
         # G = mahadian_model_generator(n1, n2, k, max_capacity)
         G = random_model_generator(n1, n2, k, max_capacity)
-        with open(output_path, encoding='utf-8', mode='w') as out:
-            out.write(graph.graph_to_UTF8_string(G))
+        graph.write_graph_file(G, output_path)
 
 
 if __name__ == '__main__':
@@ -1,9 +1,15 @@
 import copy
+import array
 import collections
-import networkx as nx
 
 BipartiteGraph = collections.namedtuple('BipartiteGraph', ['A', 'B', 'E', 'capacities'])
 
+# compact representation of a bipartite graph, the vertices in each
+# partition are numbered 0 .. n-1 and the preference list of vertex u
+# is prefs[offsets[u]:offsets[u+1]], containing ids from the other partition
+Partition = collections.namedtuple('Partition', ['names', 'lower', 'upper', 'offsets', 'prefs'])
+CompactGraph = collections.namedtuple('CompactGraph', ['A', 'B'])
+
 
 def make_graph(A, B, pref_listsA, pref_listsB, capacities):
     """
@@ -23,12 +29,100 @@ def make_graph(A, B, pref_listsA, pref_listsB, capacities):
     return BipartiteGraph(A, B, E, capacities)
 
 
+def make_partition(names, pref_lists, capacities, index):
+    """
+    creates one side of a compact graph
+    :param names: vertices in this partition, position is the id
+    :param pref_lists: dict of preference lists for the vertices in names
+    :param capacities: capacities for the vertices in names
+    :param index: dict mapping vertices in the other partition to their ids
+    :return: partition in the compact format
+    """
+    lower, upper = array.array('i'), array.array('i')
+    offsets, prefs = array.array('q', [0]), array.array('i')
+    for u in names:
+        lq, uq = capacities[u]
+        lower.append(lq)
+        upper.append(uq)
+        prefs.extend(index[v] for v in pref_lists.get(u, ()))
+        offsets.append(len(prefs))
+    return Partition(names, lower, upper, offsets, prefs)
+
+
+def make_compact_graph(A, B, pref_listsA, pref_listsB, capacities):
+    """
+    creates a compact graph given partitions A, B, and
+    the preference lists which are in the format
+    [(v, [pref_list]), ...], see make_graph
+    :param A: partition A
+    :param B: partition B
+    :param pref_listsA: preference lists for vertices in A
+    :param pref_listsB: preference lists for vertices in B
+    :param capacities: capacities for the vertices in A U B
+    :return: compact graph with vertices A U B,
+             and preference lists as specified
+    """
+    namesA, namesB = sorted(A), sorted(B)
+    A_ = make_partition(namesA, dict(pref_listsA), capacities, name_index(namesB))
+    B_ = make_partition(namesB, dict(pref_listsB), capacities, name_index(namesA))
+    return CompactGraph(A_, B_)
+
+
+def name_index(names):
+    """
+    map from the name of a vertex to its id
+    :param names: names of the vertices in a partition
+    :return: dict name -> id
+    """
+    return dict((u, i) for i, u in enumerate(names))
+
+
+def preference_list(P, u):
+    """
+    preference list for the vertex u in partition P
+    :param P: partition in a compact graph
+    :param u: id of the vertex
+    :return: ids of the vertices in the other partition, ordered by rank
+    """
+    return P.prefs[P.offsets[u]:P.offsets[u+1]]
+
+
+def to_compact_graph(G):
+    """
+    returns G in the compact format
+    :param G: bipartite graph
+    :return: compact graph equivalent to G
+    """
+    return make_compact_graph(G.A, G.B, ((a, G.E.get(a, [])) for a in G.A),
+                              ((b, G.E.get(b, [])) for b in G.B), G.capacities)
+
+
+def from_compact_graph(C):
+    """
+    returns the compact graph C as a bipartite graph
+    :param C: compact graph
+    :return: bipartite graph equivalent to C
+    """
+    def pref_lists(P, Q):
+        return ((u, [Q.names[v] for v in preference_list(P, i)])
+                for i, u in enumerate(P.names))
+
+    def capacities(P):
+        return ((u, (P.lower[i], P.upper[i])) for i, u in enumerate(P.names))
+
+    caps = dict(capacities(C.A))
+    caps.update(capacities(C.B))
+    return make_graph(set(C.A.names), set(C.B.names), pref_lists(C.A, C.B),
+                      pref_lists(C.B, C.A), caps)
+
+
 def to_networkx_graph(G):
     """
     returns G in networkx format
     :param G: bipartite graph
     :return: G in networkx graph format
     """
+    import networkx as nx
     G_ = nx.Graph()
     # add the vertices
     G_.add_nodes_from(G.A, bipartite=0)  # partition A
@@ -58,11 +152,24 @@ def upper_quota(G, u):
     return G.capacities[u][1]
 
 
-def graph_to_UTF8_string(G):
+def rank_index(G, vertices=None):
     """
-    returns the string representation of the graph in UTF-8 format
+    precompute the position of every neighbour in the preference lists,
+    so that comparing two neighbours of u takes constant time
     :param G: bipartite graph
-    :return: string representation of G
+    :param vertices: vertices to index, all the vertices in G if None
+    :return: dict u -> (dict v -> rank of v in u's preference list, 0 based)
+    """
+    if vertices is None: vertices = G.E
+    return dict((u, dict((v, i) for i, v in enumerate(G.E[u]))) for u in vertices)
+
+
+def graph_to_UTF8_chunks(G):
+    """
+    generates the representation of the graph in UTF-8 format
+    in small pieces, one vertex or preference list at a time
+    :param G: bipartite graph
+    :return: generates strings which joined give the representation of G
     """
     def to_str(u, pref_list, fn=lambda x: x):
         """
@@ -84,31 +191,88 @@ def graph_to_UTF8_string(G):
         # default capacity is 1
         else: return ''
 
-    l = list()
+    def vertices(P):
+        for i, u in enumerate(P):
+            yield '{}{} {}'.format(', ' if i else '', u, capacities_to_str(u))
+
     # vertices in partition A
-    l.append('@PartitionA\n')
-    l.append(', '.join(map(lambda a: '{} {}'.format(a, capacities_to_str(a)),
-                            G.A)))
-    l.append(' ;\n@End\n')
+    yield '@PartitionA\n'
+    yield from vertices(G.A)
+    yield ' ;\n@End\n'
 
     # vertices in partition B
-    l.append('\n@PartitionB\n')
-    l.append(', '.join(map(lambda b: '{} {}'.format(b, capacities_to_str(b)),
-                            G.B)))
-    l.append(' ;\n@End\n')
+    yield '\n@PartitionB\n'
+    yield from vertices(G.B)
+    yield ' ;\n@End\n'
 
     # preference lists for vertices in partition A
-    l.append('\n@PreferenceListsA\n')
+    yield '\n@PreferenceListsA\n'
     for a in G.A:
-        l.append('{}\n'.format(to_str(a, G.E[a])))
-    l.append('@End\n')
+        yield '{}\n'.format(to_str(a, G.E[a]))
+    yield '@End\n'
 
     # preference lists for vertices in partition B
-    l.append('\n@PreferenceListsB\n')
+    yield '\n@PreferenceListsB\n'
     for b in G.B:
-        l.append('{}\n'.format(to_str(b, G.E[b])))
-    l.append('@End\n')
-    return ''.join(l)
+        yield '{}\n'.format(to_str(b, G.E[b]))
+    yield '@End\n'
+
+
+def graph_to_UTF8_string(G):
+    """
+    returns the string representation of the graph in UTF-8 format
+    :param G: bipartite graph
+    :return: string representation of G
+    """
+    return ''.join(graph_to_UTF8_chunks(G))
+
+
+def write_graph(G, out, chunk_size=1 << 16):
+    """
+    writes the graph to the output stream without building
+    its whole representation in memory
+    :param G: bipartite graph
+    :param out: output stream in text mode
+    :param chunk_size: number of characters buffered before each write
+    :return: None
+    """
+    chunk, size = [], 0
+    for s in graph_to_UTF8_chunks(G):
+        chunk.append(s)
+        size += len(s)
+        if size >= chunk_size:
+            out.write(''.join(chunk))
+            chunk, size = [], 0
+    out.write(''.join(chunk))
+
+
+def open_graph_file(file_path, mode='r'):
+    """
+    opens a graph file in text mode, the files ending
+    in .gz or .xz are compressed with gzip or xz
+    :param file_path: path to the graph file
+    :param mode: 'r' or 'w'
+    :return: file object
+    """
+    if file_path.endswith('.gz'):
+        import gzip
+        return gzip.open(file_path, mode=mode + 't', encoding='utf-8')
+    if file_path.endswith('.xz'):
+        import lzma
+        return lzma.open(file_path, mode=mode + 't', encoding='utf-8')
+    return open(file_path, encoding='utf-8', mode=mode)
+
+
+def write_graph_file(G, file_path):
+    """
+    writes the graph to file_path, compressed if the
+    path ends in .gz or .xz, see open_graph_file
+    :param G: bipartite graph
+    :param file_path: path to the output file
+    :return: None
+    """
+    with open_graph_file(file_path, mode='w') as out:
+        write_graph(G, out)
 
 
 def graph_to_byte_string(G):
@@ -139,7 +303,7 @@ def update_pref_lists(a, b, A, B):
 
 
 # TODO: debug this
-def to_graphviz(G, M, out):
+def to_graphviz(G, M, out, ranks=None):
     """
     print a graphviz representation of M
     with edges not in M labeled with the
@@ -147,20 +311,23 @@ def to_graphviz(G, M, out):
     :param G: bipartite graph
     :param M: matching on G
     :param out: output stream
+    :param ranks: rank index for G, see rank_index
     :return: None
     """
-    def vote(u, v, M_u, pref_list):
+    ranks = rank_index(G) if ranks is None else ranks
+
+    def vote(u, v, M_u, rank):
         """
         get vote for the edge (u, v) from u's perspective
         :param u: vertex in G
         :param v: vertex in G
         :param M_u: matched partner of u, None if u is unmatched
-        :param pref_list: preference list for u
+        :param rank: ranks of the neighbours of u
         :return:
         """
 
         if M_u is None: return +1 # u prefers to be matched
-        return +1 if pref_list.index(v) < pref_list.index(M_u) else -1
+        return +1 if rank[v] < rank[M_u] else -1
 
     # return the edge labeling
     def edge_label(a, b):
@@ -168,8 +335,8 @@ def to_graphviz(G, M, out):
         if M_a == b and M_b == a: # this edge is in the matching
             return '[color=red, penwidth=3.0]'
         else:
-            vote_a = vote(a, b, M_a, G.E[a])
-            vote_b = vote(b, a, M_b, G.E[b])
+            vote_a = vote(a, b, M_a, ranks[a])
+            vote_b = vote(b, a, M_b, ranks[b])
             return '[label="({}, {})"]'.format(vote_a, vote_b)
 
     # print G with edges in E \ M labeled
@@ -180,35 +347,53 @@ def to_graphviz(G, M, out):
     print('}', file=out)
 
 
-def compare_matchings(G, M1, M2):
+def pairing_vote(only1, only2):
+    """
+    vote of a vertex for M1 over M2, the partners it has in only one of the
+    matchings are paired up in the way most favourable to M1, each pair votes
+    for the matching with the better partner, and a partner with no pair for
+    its matching
+    :param only1: ranks of the partners in M1 only, in increasing order
+    :param only2: ranks of the partners in M2 only, in increasing order
+    :return: sum of the votes
+    """
+    # the most pairs in which the partner in M1 is the better one
+    i = wins = 0
+    for index in only2:
+        if i < len(only1) and only1[i] < index:
+            wins, i = wins + 1, i + 1
+    return len(only1) - len(only2) + 2 * wins - min(len(only1), len(only2))
+
+
+def compare_matchings(G, M1, M2, ranks=None):
     """
     generator to return the votes of the vertices in G
     w.r.t two matchings M1 and M2
     vote is +1 if u prefers M1 to M2,
     -1 if u prefers M2 to M1,
-    0 if indifferent
+    0 if indifferent,
+    a hospital has a vote for each of its positions, see pairing_vote
     :param G: bipartite graph
     :param M1: matching on G
     :param M2: matching on G
+    :param ranks: rank index for G, see rank_index
     :return: generates tuples (a, vote_a)
     """
+    ranks = rank_index(G) if ranks is None else ranks
+
+    def partners(M_u):
+        if M_u is None: return set()
+        return set(M_u) if isinstance(M_u, (set, frozenset)) else {M_u}
+
     # does u prefer M1 over M2
     # +1 if yes, -1 if no, 0 if indifferent
-    def prefers_to(u, pref_list):
-        # u is matched in M1 and unmatched in M2
-        if u in M1 and u not in M2: return +1
-        # u is unmatched in M1 and matched in M2
-        if u not in M1 and u in M2: return -1
-        # u is matched in both
-        if u in M1 and u in M2:
-            indexa, indexb = pref_list.index(M1[u]), pref_list.index(M2[u])
-            if indexa == indexb: return 0  # indifferent
-            return +1 if indexa < indexb else -1  # prefers M1(u) to M2(u)
-        return 0  # indifferent, unmatched in both
+    def prefers_to(u, rank):
+        P1, P2 = partners(M1.get(u)), partners(M2.get(u))
+        return pairing_vote(sorted(rank[v] for v in P1 - P2), sorted(rank[v] for v in P2 - P1))
 
     # yield the votes
-    for a in G.A: yield a, prefers_to(a, G.E[a])
-    for b in G.B: yield b, prefers_to(b, G.E[b])
+    for a in G.A: yield a, prefers_to(a, ranks[a])
+    for b in G.B: yield b, prefers_to(b, ranks[b])
 
 
 def tabulate_matching_comparison(G, M1, M2):
@@ -224,7 +409,7 @@ def tabulate_matching_comparison(G, M1, M2):
     def vote_repr(u, vote):
         # \u2714 is the tick sign
         if vote == 0: return u, '-', '-'
-        return (u, '\u2714', '') if vote == +1 else (u, '', '\u2714')
+        return (u, '\u2714', '') if vote > 0 else (u, '', '\u2714')
     data = map(lambda x: vote_repr(x[0], x[1]), compare_matchings(G, M1, M2))
     return tabulate(data,
                     headers=['vertex', 'M1', 'M2'],
@@ -250,8 +435,9 @@ def main():
         print('usage: {} <graph file>'.format(sys.argv[0]))
     else:
         G = graph_parser.read_graph(sys.argv[1])
-        M1 = matching_algos.stable_matching_man_woman(copy_graph(G))
-        M2 = matching_algos.popular_matching_man_woman(copy_graph(G))
+        ranks = rank_index(G)
+        M1 = matching_algos.stable_matching_man_woman(G, ranks)
+        M2 = matching_algos.popular_matching_man_woman(G, ranks)
         print(to_easy_format(G, M1), to_easy_format(G, M2), sep='\n')
         # print(M1, M2, tabulate_matching_comparison(G, M1, M2), sep='\n', file=sys.stdout)
         # graph.to_graphviz(G, M1, sys.stdout)
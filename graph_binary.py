@@ -0,0 +1,133 @@
+import sys
+import mmap
+import array
+import struct
+import graph
+
+# binary format for a compact graph, all integers are little endian
+# header: magic, version, number of vertices and of preference list
+# entries in A and B, and the size of the name table in bytes,
+# followed by the arrays, each starting at a multiple of 8 bytes
+# A.offsets, B.offsets (int64), A.lower, A.upper, A.prefs,
+# B.lower, B.upper, B.prefs (int32), and the names of the vertices
+# in A and then B, encoded in UTF-8 and separated by newlines
+MAGIC = b'HRG\0'
+VERSION = 1
+header = struct.Struct('<4sIQQQQQ')
+
+
+def align(pos):
+    return (pos + 7) & ~7
+
+
+def to_bytes(typecode, values):
+    """
+    :param typecode: array typecode, 'q' or 'i'
+    :param values: integers
+    :return: values as little endian bytes
+    """
+    a = values if isinstance(values, array.array) and values.typecode == typecode \
+        else array.array(typecode, values)
+    if sys.byteorder != 'little':
+        a = array.array(typecode, a)
+        a.byteswap()
+    return a.tobytes()
+
+
+def binary_graph_chunks(G):
+    """
+    :param G: bipartite graph or compact graph
+    :return: generates the bytes of the graph in the binary format
+    """
+    C = graph.to_compact_graph(G) if isinstance(G, graph.BipartiteGraph) else G
+    names = '\n'.join(list(C.A.names) + list(C.B.names)).encode('utf-8')
+    yield header.pack(MAGIC, VERSION, len(C.A.names), len(C.B.names),
+                      len(C.A.prefs), len(C.B.prefs), len(names))
+    chunks = [to_bytes('q', C.A.offsets), to_bytes('q', C.B.offsets)]
+    for P in (C.A, C.B):
+        chunks.extend((to_bytes('i', P.lower), to_bytes('i', P.upper), to_bytes('i', P.prefs)))
+    chunks.append(names)
+    for chunk in chunks:
+        yield chunk
+        yield bytes(align(len(chunk)) - len(chunk))
+
+
+def write_binary_graph(G, file_path):
+    """
+    writes the graph to file_path in the binary format
+    :param G: bipartite graph or compact graph
+    :param file_path: path to the output file
+    :return: None
+    """
+    with open(file_path, mode='wb') as fout:
+        for chunk in binary_graph_chunks(G):
+            fout.write(chunk)
+
+
+def is_binary_graph(file_path):
+    """
+    :param file_path: path to a graph file
+    :return: True if the file is in the binary format
+    """
+    with open(file_path, mode='rb') as fin:
+        return fin.read(len(MAGIC)) == MAGIC
+
+
+def read_binary_graph(file_path):
+    """
+    maps the binary graph in file_path into memory, the arrays in the
+    returned graph are views on the mapped file and are not copied, so
+    processes that open the same file share its pages
+    :param file_path: path to the binary graph file
+    :return: compact graph, see graph.CompactGraph
+    """
+    with open(file_path, mode='rb') as fin:
+        buf = memoryview(mmap.mmap(fin.fileno(), 0, access=mmap.ACCESS_READ))
+    return from_buffer(buf, file_path)
+
+
+def from_buffer(buf, file_path='<buffer>'):
+    """
+    the graph in the binary format in buf, without copying the arrays
+    :param buf: memoryview of the binary graph, starting at a multiple of 8 bytes
+    :param file_path: name of the file for the error messages
+    :return: compact graph, see graph.CompactGraph
+    """
+    if len(buf) < header.size or bytes(buf[:len(MAGIC)]) != MAGIC:
+        raise ValueError('{}: not a binary graph file'.format(file_path))
+    _, version, nA, nB, eA, eB, names_size = header.unpack_from(buf)
+    if version != VERSION:
+        raise ValueError('{}: unsupported binary graph version {}'.format(file_path, version))
+
+    pos = header.size
+
+    def view(typecode, n):
+        nonlocal pos
+        size = n * array.array(typecode).itemsize
+        if pos + size > len(buf):
+            raise ValueError('{}: truncated binary graph file'.format(file_path))
+        v = buf[pos:pos + size]
+        pos = align(pos + size)
+        if typecode == 'B': return v
+        if sys.byteorder == 'little': return v.cast(typecode)
+        a = array.array(typecode, v.tobytes())
+        a.byteswap()
+        return a
+
+    offsetsA, offsetsB = view('q', nA + 1), view('q', nB + 1)
+    lowerA, upperA, prefsA = view('i', nA), view('i', nA), view('i', eA)
+    lowerB, upperB, prefsB = view('i', nB), view('i', nB), view('i', eB)
+    names = str(view('B', names_size), 'utf-8').split('\n') if nA + nB else []
+    return graph.CompactGraph(graph.Partition(names[:nA], lowerA, upperA, offsetsA, prefsA),
+                              graph.Partition(names[nA:], lowerB, upperB, offsetsB, prefsB))
+
+
+def main():
+    import graph_parser
+    if len(sys.argv) < 3:
+        print('usage: {} <graph file> <binary graph file>'.format(sys.argv[0]), file=sys.stderr)
+    else:
+        write_binary_graph(graph_parser.read_graph(sys.argv[1], compact=True), sys.argv[2])
+
+if __name__ == '__main__':
+    main()
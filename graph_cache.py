@@ -0,0 +1,105 @@
+import os
+import hashlib
+import tempfile
+import graph_binary
+
+
+class GraphCache:
+    """
+    on disk cache of parsed graphs, keyed by the hash of the contents
+    of the graph file and the version of the parser, the graphs are
+    stored in the binary format, see graph_binary, and the least
+    recently used ones are removed when the cache exceeds max_size bytes
+    """
+    def __init__(self, dirpath, max_size=1 << 30):
+        self.dirpath = dirpath
+        self.max_size = max_size
+        os.makedirs(dirpath, exist_ok=True)
+
+    def key(self, file_path, version):
+        """
+        see file_key
+        """
+        return file_key(file_path, version)
+
+    def path(self, key):
+        return os.path.join(self.dirpath, key + '.bin')
+
+    def get(self, key):
+        """
+        :param key: see key
+        :return: compact graph stored for the key, None if not present
+        """
+        try:
+            C = graph_binary.read_binary_graph(self.path(key))
+            os.utime(self.path(key))  # most recently used
+            return C
+        except (OSError, ValueError):
+            return None
+
+    def put(self, key, C):
+        """
+        stores the graph for the key, and evicts the least recently used graphs
+        :param key: see key
+        :param C: compact graph
+        :return: None
+        """
+        # write to a temporary file first, so that readers never see a partial file
+        fd, tmp_path = tempfile.mkstemp(dir=self.dirpath, suffix='.tmp')
+        os.close(fd)
+        try:
+            graph_binary.write_binary_graph(C, tmp_path)
+            os.replace(tmp_path, self.path(key))
+        finally:
+            if os.path.exists(tmp_path): os.remove(tmp_path)
+        self.evict()
+
+    def evict(self):
+        evict(self.dirpath, '.bin', self.max_size)
+
+
+def file_key(file_path, version):
+    """
+    :param file_path: path to the graph file
+    :param version: version of the parser
+    :return: hash of the contents of the file and the version of the parser
+    """
+    h = hashlib.sha256('{}\n'.format(version).encode('utf-8'))
+    with open(file_path, mode='rb') as fin:
+        for block in iter(lambda: fin.read(1 << 20), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def evict(dirpath, suffix, max_size):
+    """
+    removes the least recently modified files in dirpath ending with suffix,
+    until their total size is at most max_size bytes
+    """
+    entries = []
+    for entry in os.scandir(dirpath):
+        if entry.name.endswith(suffix):
+            try:
+                st = entry.stat()
+                entries.append((st.st_mtime, st.st_size, entry.path))
+            except OSError:  # removed by another process
+                pass
+    size = sum(s for _, s, _ in entries)
+    for _, s, path in sorted(entries):
+        if size <= max_size: break
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        size -= s
+
+
+def default_cache():
+    """
+    the cache is enabled by setting HR_GRAPH_CACHE to the cache directory,
+    and HR_GRAPH_CACHE_SIZE to its maximum size in megabytes
+    :return: GraphCache, None if the cache is not enabled
+    """
+    dirpath = os.environ.get('HR_GRAPH_CACHE')
+    if not dirpath: return None
+    return GraphCache(dirpath, int(os.environ.get('HR_GRAPH_CACHE_SIZE', 1024)) << 20)
@@ -1,113 +1,182 @@
-import ply.yacc as yacc
-from graph_lexer import tokens  # get the token map from the lexer
+import re
 import sys
 import graph
-
-
-# TODO: fix this, so that we can have nodes and edges in any order
-# the grammar is not clean
-def p_graph(p):
-    """graph : nodes nodes edges edges"""
-    p[0] = p[1], p[2], p[3], p[4]
-
-
-def p_partition_A(p):
-    """nodes : PARTITION_A pvertex_list ';' END"""
-    p[0] = p[2]
-
-
-def p_partition_B(p):
-    """nodes : PARTITION_B pvertex_list ';' END"""
-    p[0] = p[2]
-
-
-# the vertex list for the partitions
-def p_pvertex_list(p):
-    """pvertex_list : pvertex_list ',' pvertex"""
-    p[0] = p[1] + [p[3]]
-
-
-def p_pvertex_list_terminating(p):
-    """pvertex_list : pvertex"""
-    p[0] = [p[1]]
-
-
-# rules for a vertex declaration in vertex list
-def p_pvertex_one(p):
-    """pvertex : ID"""
-    p[0] = (p[1], (0, 1))
-
-
-def p_pvertex_capacity_upper(p):
-    """pvertex : ID '(' INT ')'"""
-    p[0] = (p[1], (0, int(p[3])))
-
-
-def p_pvertex_capacity_upper_and_lower(p):
-    """pvertex : ID '(' INT ',' INT ')'"""
-    p[0] = (p[1], (int(p[3]), int(p[5])))
-
-
-def p_vertex_list(p):
-    """vertex_list : vertex_list ',' ID"""
-    p[0] = p[1] + [p[3]]
-
-
-def p_vertex_list_terminating(p):
-    """vertex_list : ID"""
-    p[0] = [p[1]]
-
-
-def p_preference_lists_A(p):
-    """edges : PREFERENCE_LISTS_A preference_lists END"""
-    p[0] = p[2]
-
-
-def p_preference_lists_B(p):
-    """edges : PREFERENCE_LISTS_B preference_lists END"""
-    p[0] = p[2]
-
-
-def p_preference_lists(p):
-    """preference_lists : preference_lists pref_list"""
-    p[0] = p[1] + [p[2]]
-
-
-def p_preference_lists_terminating(p):
-    """preference_lists : pref_list"""
-    p[0] = [p[1]]
-
-
-def p_pref_list(p):
-    """pref_list : ID ':' vertex_list ';'"""
-    p[0] = p[1], p[3]
-
-
-# error rule for syntax errors
-def p_error(p):
-    if p:
-        print("error: {}, token {} at line {}".format(p, p.type, p.lineno), file=sys.stderr)
-        # discard the token and tell the parser it's okay.
-        parser.errok()
-    else:
-        print("error: EOF before parsing could finish.", file=sys.stderr)
-
-
-# build the parser
-parser = yacc.yacc(debug=0)
-
-
-def read_graph(file_path):
-    with open(file_path, encoding='utf-8', mode='r') as fin:
-        A, B, pref_listA, pref_listB = parser.parse(fin.read())
-        # map of the capacities
-        capacities = dict(A)
-        capacities.update(dict(B))
-        A = set(id for id, _ in A)
-        B = set(id for id, _ in B)
-        pref_listA = [(a, list(b)) for a, b in pref_listA]
-        pref_listB = [(a, list(b)) for a, b in pref_listB]
-        return graph.make_graph(A, B, pref_listA, pref_listB, capacities)
+import graph_binary
+import graph_cache
+
+# bump when a change in the parser changes the graphs it reads,
+# so that the graphs cached by earlier versions are not used
+VERSION = 2
+
+# the sections in the graph file format, they can be in any order
+PARTITION_A, PARTITION_B = '@PartitionA', '@PartitionB'
+PREFERENCE_LISTS_A, PREFERENCE_LISTS_B = '@PreferenceListsA', '@PreferenceListsB'
+SECTIONS = (PARTITION_A, PARTITION_B, PREFERENCE_LISTS_A, PREFERENCE_LISTS_B)
+END = '@End'
+
+ID = r'[@a-zA-Z0-9][a-zA-Z0-9+]*'
+id_re = re.compile(ID)
+# a keyword, a semicolon, or the text of a statement
+chunk_re = re.compile(r'@[a-zA-Z0-9+]*|;|[^@;]+')
+# vertex declaration, ID, ID (upper) or ID (lower, upper), followed by a comma
+pvertex_re = re.compile(r'\s*({})\s*(?:\(\s*([0-9]+)\s*(?:,\s*([0-9]+)\s*)?\))?\s*(,\s*|$)'.format(ID))
+# preference list, ID : ID, ID, ...
+pref_list_re = re.compile(r'\s*({0})\s*:((?:\s*{0}\s*,)*\s*{0}\s*|\s*)'.format(ID))
+
+
+class GraphSyntaxError(Exception):
+    def __init__(self, lineno, msg):
+        super().__init__('line {}: {}'.format(lineno, msg))
+        self.lineno = lineno
+
+
+def statements(lines):
+    """
+    splits the graph file into keywords and ';' terminated statements,
+    comments start with '#' and extend till the end of the line
+    :param lines: iterable over the lines of the graph file
+    :return: generates tuples (lineno, is_keyword, text)
+    """
+    parts, start = [], 0
+    for lineno, line in enumerate(lines, 1):
+        i = line.find('#')
+        if i >= 0: line = line[:i]
+        for m in chunk_re.finditer(line):
+            s = m.group()
+            if s == ';':
+                yield start or lineno, False, ''.join(parts)
+                parts, start = [], 0
+            elif s[0] == '@':
+                if parts:
+                    raise GraphSyntaxError(start, "expected ';' before {}".format(s))
+                yield lineno, True, s
+            elif parts:
+                parts.append(s)
+            elif not s.isspace():
+                parts, start = [s], lineno
+    if parts:
+        raise GraphSyntaxError(start, "expected ';' before the end of the file")
+
+
+def parse_vertices(lineno, text):
+    """
+    :param lineno: line on which the statement starts
+    :param text: comma separated vertex declarations
+    :return: generates tuples (v, (lower quota, upper quota))
+    """
+    pos = 0
+    while pos < len(text):
+        m = pvertex_re.match(text, pos)
+        if m is None:
+            raise GraphSyntaxError(lineno + text.count('\n', 0, pos),
+                                   'invalid vertex declaration {!r}'.format(text[pos:].split(',')[0].strip()))
+        v, lq, uq, comma = m.groups()
+        if uq is not None: yield v, (int(lq), int(uq))
+        elif lq is not None: yield v, (0, int(lq))
+        else: yield v, (0, 1)
+        pos = m.end()
+        if comma and pos == len(text):
+            raise GraphSyntaxError(lineno + text.count('\n'), "expected a vertex after ','")
+
+
+def parse_pref_list(lineno, text):
+    """
+    :param lineno: line on which the statement starts
+    :param text: preference list in the format u : v1, v2, ...
+    :return: tuple (u, [v1, v2, ...])
+    """
+    m = pref_list_re.fullmatch(text)
+    if m is None:
+        raise GraphSyntaxError(lineno, 'invalid preference list {!r}'.format(' '.join(text.split())))
+    return m.group(1), id_re.findall(m.group(2))
+
+
+def parse_graph(lines):
+    """
+    parses the graph file, one line at a time
+    :param lines: iterable over the lines of the graph file
+    :return: dict section -> list of vertex declarations or preference lists
+    """
+    sections, section = {}, None
+    lineno = 0
+    for lineno, is_keyword, text in statements(lines):
+        if is_keyword:
+            if text == END:
+                if section is None:
+                    raise GraphSyntaxError(lineno, '{} outside of a section'.format(END))
+                section = None
+            elif text in SECTIONS:
+                if section is not None:
+                    raise GraphSyntaxError(lineno, 'expected {} before {}'.format(END, text))
+                if text in sections:
+                    raise GraphSyntaxError(lineno, 'duplicate section {}'.format(text))
+                section = text
+                sections[section] = []
+            else:
+                raise GraphSyntaxError(lineno, 'unknown keyword {}'.format(text))
+        elif section is None:
+            raise GraphSyntaxError(lineno, 'statement outside of a section')
+        elif section in (PARTITION_A, PARTITION_B):
+            sections[section].extend(parse_vertices(lineno, text))
+        else:
+            sections[section].append(parse_pref_list(lineno, text))
+
+    if section is not None:
+        raise GraphSyntaxError(lineno, 'expected {} before the end of the file'.format(END))
+    missing = [s for s in SECTIONS if s not in sections]
+    if missing:
+        raise GraphSyntaxError(lineno, 'missing section {}'.format(', '.join(missing)))
+    return sections
+
+
+def read_graph(file_path, compact=False, cache=None, key=None):
+    """
+    reads a graph from file_path, in the text or the binary format,
+    text files ending in .gz or .xz are decompressed while reading
+    :param file_path: path to the graph file
+    :param compact: return a compact graph instead of a bipartite graph
+    :param cache: graph_cache.GraphCache for the parsed graphs, by default
+                  the one configured in the environment, see graph_cache.default_cache,
+                  False to not use a cache
+    :param key: key of the file in the cache if it is already known, see graph_cache.file_key
+    :return: graph described in the file
+    """
+    if graph_binary.is_binary_graph(file_path):
+        C = graph_binary.read_binary_graph(file_path)
+        return C if compact else graph.from_compact_graph(C)
+
+    cache = graph_cache.default_cache() if cache is None else cache
+    if cache:
+        key = cache.key(file_path, VERSION) if key is None else key
+        C = cache.get(key)
+        if C is not None:
+            return C if compact else graph.from_compact_graph(C)
+
+    G = parse_graph_file(file_path, compact)
+    if cache:
+        try:
+            cache.put(key, G if compact else graph.to_compact_graph(G))
+        except (KeyError, OSError):  # a vertex is not declared, or the cache is not writable
+            pass
+    return G
+
+
+def parse_graph_file(file_path, compact=False):
+    """
+    parses the graph file, see read_graph
+    """
+    with graph.open_graph_file(file_path) as fin:
+        sections = parse_graph(fin)
+    A, B = sections[PARTITION_A], sections[PARTITION_B]
+    # map of the capacities
+    capacities = dict(A)
+    capacities.update(dict(B))
+    A = set(id for id, _ in A)
+    B = set(id for id, _ in B)
+    pref_listA, pref_listB = sections[PREFERENCE_LISTS_A], sections[PREFERENCE_LISTS_B]
+    if compact:
+        return graph.make_compact_graph(A, B, pref_listA, pref_listB, capacities)
+    return graph.make_graph(A, B, pref_listA, pref_listB, capacities)
 
 
 def main():
@@ -115,7 +184,10 @@ def main():
         print('usage: {} <graph file path>'.format(sys.argv[0]), file=sys.stderr)
     else:
         file_path = sys.argv[1]
-        print(read_graph(file_path))
+        try:
+            print(read_graph(file_path))
+        except GraphSyntaxError as e:
+            print('error: {}: {}'.format(file_path, e), file=sys.stderr)
 
 if __name__ == '__main__':
     main()
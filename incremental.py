@@ -0,0 +1,226 @@
+import heapq
+import graph
+
+
+def worst_heap(M, h, ranks, heaps):
+    """
+    heap of the residents assigned to h, the worst one on top,
+    built on the first access since only a few hospitals are touched
+    :param M: matching
+    :param h: hospital
+    :param ranks: rank index, see graph.rank_index
+    :param heaps: dict h -> heap of (-rank of r in h's list, r)
+    :return: heap for h
+    """
+    if h not in heaps:
+        heaps[h] = [(-ranks[h][r], r) for r in M.get(h, ())]
+        heapq.heapify(heaps[h])
+    return heaps[h]
+
+
+def repair(G, M, ranks, free):
+    """
+    repairs M after an event by continuing the resident proposing
+    algorithm from the current state for the free residents
+    :param G: bipartite graph, already updated for the event
+    :param M: matching in G, modified in place
+    :param ranks: rank index for G, see graph.rank_index
+    :param free: list of (r, i), r proposes starting from the i-th hospital on its list
+    :return: dict r -> (old partner, new partner) for the residents that moved
+    """
+    heaps, old = {}, {}
+
+    def assign(r, h):
+        heap = worst_heap(M, h, ranks, heaps)
+        M[r] = h
+        M.setdefault(h, set()).add(r)
+        heapq.heappush(heap, (-ranks[h][r], r))
+
+    while free:  # while free is not empty
+        r, i = free.pop()
+        old.setdefault(r, M.get(r))
+        pref_list = G.E[r]
+        while i < len(pref_list):  # propose till r is accepted
+            h = pref_list[i]
+            i += 1
+            rank, quota = ranks[h].get(r), graph.upper_quota(G, h)
+            if rank is None or quota <= 0: continue
+            heap = worst_heap(M, h, ranks, heaps)
+            if len(heap) < quota:  # h is under-subscribed
+                assign(r, h)
+                break
+            if rank < -heap[0][0]:  # h prefers r to its worst resident
+                _, r_ = heapq.heappop(heap)
+                old.setdefault(r_, h)
+                del M[r_]
+                M[h].discard(r_)
+                free.append((r_, ranks[r_][h] + 1))  # r_ continues after h
+                assign(r, h)
+                break
+
+    return dict((r, (h, M.get(r))) for r, h in old.items() if h != M.get(r))
+
+
+def move(M, s, h, changed):
+    """
+    moves the resident s to the hospital h in M, and records it in changed
+    """
+    h_ = M.get(s)
+    if h_ is not None:
+        M[h_].discard(s)
+        if not M[h_]: del M[h_]
+    M[s] = h
+    M.setdefault(h, set()).add(s)
+    changed[s] = (changed[s][0] if s in changed else h_, h)
+
+
+def vacancy_chain(G, M, ranks, h, changed):
+    """
+    fills the vacancy of h left by a removed resident, h admits the resident
+    it ranks highest among those that prefer h to their partner, and the
+    hospital that resident left has a vacancy in turn, till no resident
+    wants the vacant hospital, M is then stable but not always resident optimal
+    :param G: bipartite graph
+    :param M: matching in G, stable but for the vacancy of h, modified in place
+    :param ranks: rank index for G, see graph.rank_index
+    :param h: hospital which lost a resident
+    :param changed: dict r -> (old partner, new partner), updated for the residents that moved
+    """
+    while h is not None:
+        # h has a vacancy, so the first resident on its list preferring h blocks
+        s = next((s for s in G.E[h] if h in ranks[s] and (M.get(s) is None or ranks[s][h] < ranks[s][M[s]])),
+                 None)
+        if s is None: break
+        h_ = M.get(s)
+        move(M, s, h, changed)
+        h = h_
+
+
+def next_resident(G, M, ranks, h, worst):
+    """
+    :param worst: dict h -> rank of the worst partner of h, filled on the first access
+    :return: the first resident h ranks below its partners preferring h to
+             its partner, None if there is none, it is unmatched, or h is not full
+    """
+    partners = M.get(h, ())
+    if len(partners) < graph.upper_quota(G, h): return None
+    if h not in worst:
+        worst[h] = max(ranks[h][s] for s in partners)
+    for s in G.E[h][worst[h] + 1:]:
+        if h in ranks[s] and (M.get(s) is None or ranks[s][h] < ranks[s][M[s]]):
+            return s if M.get(s) is not None else None
+    return None
+
+
+def resident_rotations(G, M, ranks, hospitals, changed):
+    """
+    makes the stable matching M resident optimal by eliminating the rotations
+    which move residents up, a full hospital h points to the partner of its
+    next resident, see next_resident, and a cycle of the pointers is a rotation,
+    every h on it admits its next resident, which leaves the following hospital
+    :param G: bipartite graph
+    :param M: stable matching in G, modified in place
+    :param ranks: rank index for G, see graph.rank_index
+    :param hospitals: hospitals whose pointer may have changed since M was
+                      resident optimal, a rotation goes through one of them
+    :param changed: dict r -> (old partner, new partner), updated for the residents that moved
+    """
+    work, dead, worst = set(hospitals), set(), {}
+    while work:
+        h = work.pop()
+        path, position = [], {}
+        while h is not None and h not in position and h not in dead:
+            position[h] = len(path)
+            path.append(h)
+            s = next_resident(G, M, ranks, h, worst)
+            h = None if s is None else M[s]
+        if h is None or h in dead:
+            dead.update(path)
+            continue
+        rotation = [(next_resident(G, M, ranks, g, worst), g) for g in path[position[h]:]]
+        for s, g in rotation:
+            work.update(G.E[s][:ranks[s][M[s]]])
+            move(M, s, g, changed)
+        for s, g in rotation:  # s is below the other partners of g
+            work.add(g)
+            worst[g] = ranks[g][s]
+        dead = set()
+
+
+def add_resident(G, M, r, pref_list, positions=None, ranks=None):
+    """
+    adds the resident r to G, and repairs the resident optimal stable matching M
+    :param G: bipartite graph, modified in place
+    :param M: resident optimal stable matching in G, modified in place
+    :param r: new resident
+    :param pref_list: preference list for r
+    :param positions: dict h -> index where r is inserted on h's preference list,
+                      r is appended for the hospitals not present
+    :param ranks: rank index for G, see graph.rank_index, kept up to date
+    :return: M, and dict r -> (old partner, new partner) for the residents that moved
+    """
+    ranks = graph.rank_index(G) if ranks is None else ranks
+    positions = {} if positions is None else positions
+    G.A.add(r)
+    G.capacities[r] = (0, 1)
+    G.E[r] = list(pref_list)
+    ranks.update(graph.rank_index(G, (r,)))
+    for h in pref_list:
+        G.E[h].insert(positions.get(h, len(G.E[h])), r)
+        ranks.update(graph.rank_index(G, (h,)))
+    return M, repair(G, M, ranks, [(r, 0)])
+
+
+def remove_resident(G, M, r, ranks=None):
+    """
+    removes the resident r from G, and repairs the resident optimal stable matching M
+    :param G: bipartite graph, modified in place
+    :param M: resident optimal stable matching in G, modified in place
+    :param r: resident to be removed
+    :param ranks: rank index for G, see graph.rank_index, kept up to date
+    :return: M, and dict r -> (old partner, new partner) for the residents that moved
+    """
+    ranks = graph.rank_index(G) if ranks is None else ranks
+    above = G.E[r][:ranks[r][M[r]] + 1] if r in M else list(G.E[r])
+    for h in G.E[r]:
+        G.E[h].remove(r)
+        ranks.update(graph.rank_index(G, (h,)))
+    G.A.remove(r)
+    del G.E[r], G.capacities[r], ranks[r]
+
+    changed = {}
+    if r in M:
+        h = M.pop(r)
+        M[h].discard(r)
+        if not M[h]: del M[h]
+        changed[r] = (h, None)
+        vacancy_chain(G, M, ranks, h, changed)
+    # the hospitals r or a resident that moved preferred to its old partner
+    # lost a candidate for the next resident, or a partner
+    hospitals = set(above)
+    for s, (h_, _) in changed.items():
+        if s != r:
+            hospitals.update(G.E[s][:ranks[s][h_] + 1] if h_ is not None else G.E[s])
+    resident_rotations(G, M, ranks, hospitals, changed)
+    return M, dict((s, (h, h_)) for s, (h, h_) in changed.items() if h != h_)
+
+
+def change_preferences(G, M, r, pref_list, positions=None, ranks=None):
+    """
+    replaces the preference list of the resident r, and repairs
+    the resident optimal stable matching M
+    :param G: bipartite graph, modified in place
+    :param M: resident optimal stable matching in G, modified in place
+    :param r: resident
+    :param pref_list: new preference list for r
+    :param positions: see add_resident
+    :param ranks: rank index for G, see graph.rank_index, kept up to date
+    :return: M, and dict r -> (old partner, new partner) for the residents that moved
+    """
+    ranks = graph.rank_index(G) if ranks is None else ranks
+    M, removed = remove_resident(G, M, r, ranks)
+    M, added = add_resident(G, M, r, pref_list, positions, ranks)
+    changed = removed
+    for s, (_, h) in added.items():
+        changed[s] = (changed[s][0] if s in changed else added[s][0], h)
+    return M, dict((s, (h, h_)) for s, (h, h_) in changed.items() if h != h_)
@@ -1,9 +1,15 @@
 #!/usr/bin/env python3
 
 import os
+import sys
 import time
+import signal
+import threading
+import traceback
+import functools
 import subprocess
 import collections
+import concurrent.futures
 
 import sea
 import sea2
@@ -12,6 +18,20 @@ import stats
 
 CPPCODE_DIR = '/mnt/f55c6248-0895-4d46-8d0e-1db681847773/meghana/sea/GraphMatching/cmake-build-debug'
 
+# options to graphmatching for each of the matchings
+CPP_OPTIONS = (('-s', sea.STABLE),
+               ('-p', sea.MAX_CARD_POPULAR),
+               ('-m', sea.POP_AMONG_MAX_CARD),
+               ('-h', sea.HRLQ_HHEURISTIC),
+               ('-e', sea.MAXIMAL_ENVYFREE))
+
+# result of a job, value is None and error is the traceback if the job failed
+JobResult = collections.namedtuple('JobResult', ['args', 'value', 'error', 'elapsed'])
+
+
+class JobTimeout(Exception):
+    pass
+
 
 def recurse_directory(dirpath, filefn):
     """
@@ -35,6 +55,103 @@ def clean_directory(dirpath, fn):
     recurse_directory(dirpath, filefn)
 
 
+def graph_files(dirpath, ignore_fn):
+    """
+    paths of the files in dirpath, recursively, except the ones ignored by ignore_fn
+    """
+
+    paths = []
+    recurse_directory(dirpath, lambda entry: None if ignore_fn(entry.name) else paths.append(entry.path))
+    return paths
+
+
+def run_job(fn, args, timeout=None):
+    """
+    runs fn(*args), a failure is returned instead of raised so that
+    it does not stop the other jobs, the timeout is enforced with
+    SIGALRM, and only when the job runs in the main thread of a process
+    :return: value, error and elapsed time, see JobResult
+    """
+
+    def alarm(signum, frame):
+        raise JobTimeout('job timed out after {} s'.format(timeout))
+
+    use_alarm = (timeout is not None and hasattr(signal, 'setitimer') and
+                 threading.current_thread() is threading.main_thread())
+    start = time.time()
+    if use_alarm:
+        handler = signal.signal(signal.SIGALRM, alarm)
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        return fn(*args), None, time.time() - start
+    except Exception:
+        return None, traceback.format_exc(), time.time() - start
+    finally:
+        if use_alarm:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            signal.signal(signal.SIGALRM, handler)
+
+
+def run_jobs(fn, jobs, workers=1, timeout=None, threads=False):
+    """
+    runs fn on the arguments of each job in a pool of worker processes,
+    or threads, the results are generated in the order of the jobs
+    as soon as they, and the jobs before them, are complete, if a worker
+    process dies the jobs left are run again in a new pool
+    :param fn: function to run, module level so that it can be pickled
+    :param jobs: tuples of arguments for fn
+    :param workers: number of workers, the jobs run in this process if 1
+    :param timeout: seconds after which a job is stopped, see run_job,
+                    a thread cannot be stopped so it needs workers == 1
+    :param threads: use a pool of threads instead of processes
+    :return: generates JobResult for each job
+    """
+
+    jobs = list(jobs)
+    if workers == 1:
+        for args in jobs:
+            yield JobResult(args, *run_job(fn, args, timeout))
+        return
+    if threads and timeout is not None:
+        raise ValueError('a timeout cannot stop a job running in a thread, use processes')
+
+    pool = concurrent.futures.ThreadPoolExecutor if threads else concurrent.futures.ProcessPoolExecutor
+    results, todo, i = {}, list(range(len(jobs))), 0
+
+    while todo:
+        with pool(max_workers=workers) as executor:
+            futures = [(k, executor.submit(run_job, fn, jobs[k], timeout)) for k in todo]
+            broken = []
+            for k, future in futures:
+                try:
+                    results[k] = JobResult(jobs[k], *future.result())
+                except concurrent.futures.BrokenExecutor:  # a worker died
+                    broken.append(k)
+                except Exception:
+                    results[k] = JobResult(jobs[k], None, traceback.format_exc(), 0.0)
+                while i in results:
+                    yield results.pop(i)
+                    i += 1
+        # the pool starts the jobs in order, and queues one more than it
+        # has workers, only the first jobs left may have killed the worker,
+        # they run alone, the others are submitted to a new pool
+        for k in broken[:workers + 1]:
+            with pool(max_workers=1) as executor:
+                try:
+                    results[k] = JobResult(jobs[k], *executor.submit(run_job, fn, jobs[k], timeout).result())
+                except Exception:
+                    results[k] = JobResult(jobs[k], None, traceback.format_exc(), 0.0)
+        todo = broken[workers + 1:]
+        while i in results:
+            yield results.pop(i)
+            i += 1
+
+
+def print_failure(result):
+    print('failed', *result.args, 'after', result.elapsed, 's', file=sys.stderr)
+    print(result.error, file=sys.stderr)
+
+
 def names_matching(*undesired, fn=lambda filename, pat: False):
     """
     returns a function which takes a filename and returns true if
@@ -44,57 +161,123 @@ def names_matching(*undesired, fn=lambda filename, pat: False):
     return lambda filename: len([pat for pat in undesired if fn(filename, pat)]) > 0
 
 
+def generate_matching(G_path, mdesc, cppopt, timeout=None):
+    """
+    output the matching mdesc for the graph in G_path, graphmatching
+    is killed if it runs for more than timeout seconds
+    """
+
+    G_name = os.path.basename(G_path)
+    G_path = os.path.abspath(G_path)
+    dirpath = os.path.split(G_path)[0]
+
+    mpath = os.path.join(dirpath, '{}{}'.format(mdesc, G_name))
+    subprocess.run([os.path.join(CPPCODE_DIR, 'graphmatching'),
+                    '-A', cppopt, '-i', G_path, '-o', mpath],
+                    check=True, timeout=timeout)
+    return mpath
+
+
 def generate_matchings(entry, M_req):
     """
     output matchings specified in M_req for graph in entry
     """
     
-    G_name = entry.name
-    G_path = os.path.abspath(entry.path)
-    dirpath = os.path.split(G_path)[0]
-
     # generate matchings that are needed
-    for cppopt, mdesc in (('-s', sea.STABLE),
-                          ('-p', sea.MAX_CARD_POPULAR),
-                          ('-m', sea.POP_AMONG_MAX_CARD),
-                          ('-h', sea.HRLQ_HHEURISTIC),
-                          ('-e', sea.MAXIMAL_ENVYFREE)):
+    for cppopt, mdesc in CPP_OPTIONS:
         if mdesc in M_req:
             print('working on', entry.path, 'computing', mdesc)
             start = time.time()
-            mpath = os.path.join(dirpath, '{}{}'.format(mdesc, G_name))
-            subprocess.run([os.path.join(CPPCODE_DIR, 'graphmatching'),
-                            '-A', cppopt, '-i', G_path, '-o', mpath],
-                            check=True)
+            generate_matching(entry.path, mdesc, cppopt)
             end = time.time()
             print('completed', mdesc, 'took', end - start, 's')
 
 
-def compute_matchings(dirpath, matchings, ignore_fn):
-    filefn = lambda entry: (None if ignore_fn(entry.name) else generate_matchings(entry, matchings))
-    recurse_directory(dirpath, filefn)
+def compute_matchings(dirpath, matchings, ignore_fn, workers=1, timeout=None):
+    """
+    output the matchings for every graph in dirpath, the (graph, matching)
+    jobs run on workers threads, each waiting on its graphmatching process
+    """
 
+    jobs = [(G_path, mdesc, cppopt, timeout)
+            for G_path in graph_files(dirpath, ignore_fn)
+            for cppopt, mdesc in CPP_OPTIONS if mdesc in matchings]
+    for result in run_jobs(generate_matching, jobs, workers, threads=True):
+        if result.error is None:
+            print('completed', result.value, 'took', result.elapsed, 's')
+        else:
+            print_failure(result)
+
+
+def write_stats(results, sink, G_name):
+    """
+    writes the statistics of the jobs to the sink as they complete, with
+    the directory and the name of the graph and the time taken, the jobs
+    that failed or timed out are reported and left out
+    :param results: results of the jobs, the values are (directory, statistics)
+    :param sink: stats.StatsSink
+    :param G_name: function taking the arguments of a job, and returning the name of the graph
+    """
+    for result in results:
+        if result.error is None:
+            G_dirpath, file_stats = result.value
+            sink.write(dict(file_stats, dir=G_dirpath, graph=G_name(result.args), elapsed=result.elapsed))
+        else:
+            print_failure(result)
+
+
+def statistics_HR(dirpath, ignore_fn, sink, workers=1, timeout=None):
+    """
+    statistics for every graph in dirpath, computed on workers processes,
+    and written to the sink, see write_stats
+    """
 
-def statistics_HR(dirpath, ignore_fn):
     matchings = (sea.STABLE, sea.MAX_CARD_POPULAR, sea.POP_AMONG_MAX_CARD)
-    stats = collections.defaultdict(list)
-    
-    filefn = lambda entry: (None if ignore_fn(entry.name) else sea.generate_file_stats(entry, matchings, stats))
-    recurse_directory(dirpath, filefn)
-    return stats
+    jobs = [(G_path, matchings) for G_path in graph_files(dirpath, ignore_fn)]
+    write_stats(run_jobs(sea.hr_file_stats, jobs, workers, timeout), sink,
+                lambda args: os.path.basename(args[0]))
+
+
+def archive_kind(filename):
+    """
+    kind of the record for a file in the dataset directory, see dataset_archive.pack_directory
+    """
+
+    import dataset_archive
+    if filename.startswith('stats_'): return dataset_archive.STATS
+    if filename.endswith('pdf') or filename.endswith('tex'): return None
+    if any(filename.startswith(mdesc) for _, mdesc in CPP_OPTIONS + (('', sea.HRLQ_RHEURISTIC),)):
+        return dataset_archive.MATCHING
+    return dataset_archive.GRAPH
+
+
+def statistics_HR_archive(archive_path, sink, workers=1, timeout=None):
+    """
+    statistics for every graph in the archive, see statistics_HR
+    """
+
+    import dataset_archive
+    matchings = (sea.STABLE, sea.MAX_CARD_POPULAR, sea.POP_AMONG_MAX_CARD)
+    with dataset_archive.DatasetArchive(archive_path) as archive:
+        jobs = [(archive_path, G_name) + sea.hr_archive_records(archive, G_name, matchings)
+                for G_name in archive.names(dataset_archive.GRAPH)]
+    write_stats(run_jobs(sea.hr_archive_stats, jobs, workers, timeout), sink,
+                lambda args: os.path.basename(args[1]))
 
 
 def statistics_HRLQ(dirpath, ignore_fn):
-    # generate stats
-    sea2.generate_stats(dirpath)
-    
-    # print stats
     for dataset in ('shuffle', 'master', 'random'):
         dataset_dirpath = os.path.join(dirpath, dataset)
+        records = os.path.join(dirpath, 'stats_{}.jsonl'.format(dataset))
         outfile = os.path.join(dirpath, 'stats_{}.csv'.format(dataset))
-    
+
+        # generate stats
+        with stats.StatsSink(records, mode='w') as sink:
+            sea2.generate_stats(dataset_dirpath, sink)
+
+        # print stats
         with open(outfile, mode='w', encoding='utf-8') as fout:
-            stats.recurse_dir(dataset_dirpath, fout)
+            stats.write_csv(stats.read_records(records), fout)
 
 
 def run_experiments(dirpath, matchings, ignore_fn, statistics_fn):
@@ -110,38 +293,28 @@ def run_experiments_HRLQ(dirpath):
     return run_experiments(dirpath, matchings, ignore_fn, statistics_HRLQ)
 
 
-def run_experiments_HR(dirpath):
+def run_experiments_HR(dirpath, sink, workers=1, timeout=None):
     matchings = (sea.STABLE, sea.MAX_CARD_POPULAR, sea.POP_AMONG_MAX_CARD)
     ignore_fn = names_matching(*matchings, 'stats_', 'pdf', 'tex',
                                fn=lambda filename, pat: filename.startswith(pat) or filename.endswith(pat))
-    return run_experiments(dirpath, matchings, ignore_fn, statistics_HR)
-
-
-def average(stats):
-    def avg(desc, data):
-        '''
-        average of particular desc
-        M_p_vs_M_s or M_m_vs_M_s
-        '''
-        delta = 0
-        delta_1 = 0
-        delta_r = 0
-        bp_m = 0
-        M_s = 0
-        n = len(data)
-
-        for row in data:
-            delta += row[desc]['delta']
-            delta_1 += row[desc]['delta_1']
-            delta_r += row[desc]['delta_r']
-            bp_m += row[desc]['bp_m']
-            M_s += row['S_M_s']
-
-        return {'S_M_s': M_s/n, 'delta': delta/n, 'delta_1': delta_1/n, 'delta_r': delta_r/n, 'bp_m': bp_m/n}
+    statistics_fn = functools.partial(statistics_HR, sink=sink, workers=workers, timeout=timeout)
+    return run_experiments(dirpath, matchings, ignore_fn, statistics_fn)
 
+
+def average(records):
+    """
+    averages of the statistics of the graphs in each directory, computed
+    in one pass over the records, see statistics_HR
+    :param records: statistics records
+    :return: dict directory -> {'M_p_vs_M_s': averages, 'M_m_vs_M_s': averages, 'R', 'H'}
+    """
     avg_stats = {}
-    for k, v in stats.items():
-        avg_stats[k] = {'M_p_vs_M_s': avg('M_p_vs_M_s', v), 'M_m_vs_M_s': avg('M_m_vs_M_s', v)}
+    for k, g in stats.aggregate(records, lambda record: record['dir']).items():
+        avg_stats[k] = {'R': g['R'].mean, 'H': g['H'].mean}
+        for desc in ('M_p_vs_M_s', 'M_m_vs_M_s'):
+            avg_stats[k][desc] = {'S_M_s': g['S_M_s'].mean}
+            for key in ('delta', 'delta_1', 'delta_r', 'bp_m'):
+                avg_stats[k][desc][key] = g['{}.{}'.format(desc, key)].mean
     return avg_stats
 
 
@@ -151,8 +324,10 @@ if __name__ == '__main__':
 
     HR_dirpath = os.path.join(dirpath, 'HR/shuffle')
     HRLQ_dirpath = os.path.join(dirpath, 'HRLQ')
-    stats = run_experiments_HR(HR_dirpath)
-    avg_stats = average(stats)
+    records = os.path.join(HR_dirpath, 'stats.jsonl')
+    with stats.StatsSink(records, mode='w') as sink:
+        run_experiments_HR(HR_dirpath, sink, workers=os.cpu_count())
+    avg_stats = average(stats.read_records(records))
 
     for k, v in avg_stats.items():
         M_p_vs_M_s = v['M_p_vs_M_s']
@@ -162,5 +337,5 @@ if __name__ == '__main__':
         s2 = '{}&{}&{}&{}'.format(M_m_vs_M_s['delta'], M_m_vs_M_s['bp_m'], M_m_vs_M_s['delta_1'], M_m_vs_M_s['delta_r'])
 
         a = k.split(os.sep)
-        print(a[-2], a[-1], stats[k][0]['R'], stats[k][0]['H'], M_m_vs_M_s['S_M_s'], s1, s2)
+        print(a[-2], a[-1], v['R'], v['H'], M_m_vs_M_s['S_M_s'], s1, s2)
     #run_experiments_HRLQ(HRLQ_dirpath)
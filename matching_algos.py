@@ -1,116 +1,221 @@
 import graph
 import matching_utils
 import sys
-import copy
 import heapq
 import collections
-import networkx
 
 
-def max_card_man_woman(G):
+def networkx_maximum_matching(G):
+    """
+    maximum matching in G using networkx, kept as a reference
+    implementation for hopcroft_karp, networkx is imported on demand
+    :param G: bipartite graph where every vertex has capacity 1
+    :return: dict with the partner of every matched vertex
+    """
+    import networkx
+    return networkx.bipartite.maximum_matching(graph.to_networkx_graph(G), top_nodes=G.A)
+
+
+def hopcroft_karp(G, quota):
+    """
+    computes maximum cardinality matching in G with capacities on the
+    hospitals, the phases are as in Hopcroft-Karp: a BFS layers the
+    graph starting from the free residents and stops at the layer with
+    a hospital with spare capacity, then a DFS finds augmenting paths
+    along the layers, a full hospital is left through any of its residents
+    :param G: bipartite graph
+    :param quota: function returning the capacity of a hospital
+    :return: dict r -> h, and dict h -> set of residents assigned to h
+    """
+    mate, assigned = {}, collections.defaultdict(set)
+
+    # start with a greedy matching
+    for r in G.A:
+        for h in G.E[r]:
+            if len(assigned[h]) < quota(h):
+                mate[r] = h
+                assigned[h].add(r)
+                break
+
+    def augment(r0):
+        # the stack alternates between residents and hospitals, each
+        # with an iterator over the vertices still to be explored
+        stack = [(r0, iter(G.E[r0]))]
+        while stack:
+            u, it = stack[-1]
+            if len(stack) % 2:  # u is a resident
+                h = next((h for h in it if dist_h.get(h) == dist[u] + 1), None)
+                if h is None:  # no augmenting path through u
+                    dist[u] = None
+                    stack.pop()
+                elif len(assigned[h]) < quota(h):  # augment along the stack
+                    path = [v for v, _ in stack] + [h]
+                    for r, h_ in zip(path[::2], path[1::2]):
+                        if r in mate: assigned[mate[r]].discard(r)
+                        mate[r] = h_
+                        assigned[h_].add(r)
+                    return True
+                else:
+                    stack.append((h, iter(assigned[h])))
+            else:  # u is a full hospital
+                r = next((r for r in it if dist.get(r) == dist_h[u]), None)
+                if r is None:  # no augmenting path through u
+                    dist_h[u] = None
+                    stack.pop()
+                else:
+                    stack.append((r, iter(G.E[r])))
+        return False
+
+    while True:
+        # layer the graph, dist is the layer of a resident and
+        # dist_h the layer of a hospital
+        free = [r for r in G.A if r not in mate]
+        dist, dist_h = dict((r, 0) for r in free), {}
+        layer, found = free, False
+        while layer and not found:
+            next_layer = []
+            for r in layer:
+                for h in G.E[r]:
+                    if h in dist_h or quota(h) <= 0: continue
+                    dist_h[h] = dist[r] + 1
+                    if len(assigned[h]) < quota(h):
+                        found = True  # an augmenting path ends at h
+                        continue
+                    for r_ in assigned[h]:
+                        if r_ not in dist:
+                            dist[r_] = dist_h[h]
+                            next_layer.append(r_)
+            layer = next_layer
+
+        if not found: break
+        # augment along vertex disjoint shortest paths
+        if not [r for r in free if augment(r)]: break
+
+    return mate, dict((h, assigned[h]) for h in assigned if assigned[h])
+
+
+def max_card_man_woman(G, backend='native'):
     """
     computes maximum cardinality matching in a bipartite graph,
     :param G: bipartite graph
+    :param backend: 'native' for hopcroft_karp, or 'networkx'
     :return: maximum cardinality matching in G
     """
-    G_nx = graph.to_networkx_graph(G)
-    M = networkx.bipartite.maximum_matching(G_nx)
-    M_max_card = dict((h, M[h]) for h in G.B if h in M)
-    M_max_card.update(dict((r, M[r]) for r in G.A if r in M))
+    if backend == 'networkx':
+        M = networkx_maximum_matching(G)
+        M_max_card = dict((h, M[h]) for h in G.B if h in M)
+        M_max_card.update(dict((r, M[r]) for r in G.A if r in M))
+        return M_max_card
+
+    mate, assigned = hopcroft_karp(G, lambda h: 1)
+    M_max_card = dict((h, next(iter(assigned[h]))) for h in assigned)
+    M_max_card.update(mate)
     return M_max_card
 
 
-def max_card_hospital_residents(G):
+def max_card_hospital_residents(G, backend='native'):
     """
     computes maximum cardinality matching in a bipartite graph,
     :param G: bipartite graph
+    :param backend: 'native' for hopcroft_karp, or 'networkx'
+                    which runs on the instance blown up by the capacities
     :return: maximum cardinality matching in G
     """
-    G_, reverse_copies = matching_utils.blow_instance(G)
-    G_nx = graph.to_networkx_graph(G_)
-    M = networkx.bipartite.maximum_matching(G_nx)
-    M_max_card = collections.defaultdict(set)
-    for h in G_.B:
-        if h in M:
-            M_max_card[reverse_copies[h]].add(M[h])
-    M_max_card.update(dict((r, reverse_copies[M[r]]) for r in G.A if r in M))
+    if backend == 'networkx':
+        G_, reverse_copies = matching_utils.blow_instance(G)
+        M = networkx_maximum_matching(G_)
+        M_max_card = collections.defaultdict(set)
+        for h in G_.B:
+            if h in M:
+                M_max_card[reverse_copies[h]].add(M[h])
+        M_max_card.update(dict((r, reverse_copies[M[r]]) for r in G.A if r in M))
+        return M_max_card
+
+    mate, assigned = hopcroft_karp(G, lambda h: graph.upper_quota(G, h))
+    M_max_card = dict(assigned)
+    M_max_card.update(mate)
     return M_max_card
 
 
-def stable_matching_man_woman(G):
+def deferred_acceptance(G, quota, ranks):
+    """
+    resident proposing deferred acceptance, G is not modified,
+    instead every resident keeps a pointer to the next hospital
+    on its preference list that it will propose to
+    :param G: bipartite graph
+    :param quota: function returning the capacity of a hospital
+    :param ranks: rank index for the hospitals in G, see graph.rank_index
+    :return: dict h -> heap of (-rank of r in h's list, r) for
+             the residents r assigned to h, the worst one on top
+    """
+    assigned = collections.defaultdict(list)
+    next_choice = {}  # index of the next hospital r will propose to
+    free_list = [r for r in G.A]  # free_list behaves like a stack
+
+    while free_list:  # while free_list is not empty
+        r = free_list.pop()  # remove a resident from free_list
+        pref_list, i = G.E[r], next_choice.get(r, 0)
+        while i < len(pref_list):  # propose till r is accepted
+            h = pref_list[i]
+            i += 1
+            rank = ranks[h].get(r)
+            # h does not find r acceptable or has no capacity
+            if rank is None or quota(h) <= 0: continue
+            if len(assigned[h]) < quota(h):  # h is under-subscribed
+                heapq.heappush(assigned[h], (-rank, r))
+                break
+            # h is fully subscribed, it only accepts r
+            # if r is better than its worst assigned resident
+            if rank < -assigned[h][0][0]:
+                _, r_ = heapq.heapreplace(assigned[h], (-rank, r))
+                free_list.append(r_)  # r_ is now free
+                break
+        next_choice[r] = i
+
+    return assigned
+
+
+def stable_matching_man_woman(G, ranks=None):
     """
     computes stable matching in a bipartite graph,
     where man and woman have preferences on each other
     :param G: bipartite graph
+    :param ranks: rank index for G, see graph.rank_index
     :return: man optimal stable matching
     """
-    # mark all men (by pushing into the free_list) and women (implicitly) free
-    # free_list behaves like a stack
-    M, free_list = {}, [m for m in G.A]
-
-    while free_list:  # while free_list is not empty
-        m = free_list.pop()  # remove a man from free_list
-        if G.E[m]:  # if m's pref list is not empty
-            w = G.E[m][0]  # w is the most preferred woman for m
-            if w in M:  # if w is matched
-                free_list.append(M[w])  # add M[w] to free_list
-            M[w] = m  # accept proposal from m
-            graph.update_pref_lists(m, w, G.E, G.E)
+    ranks = graph.rank_index(G, G.B) if ranks is None else ranks
+    assigned = deferred_acceptance(G, lambda w: 1, ranks)
 
+    # every woman has at most one partner
+    M = dict((w, assigned[w][0][1]) for w in assigned if assigned[w])
     # add partners for a to M
     M.update(dict((a, b) for b, a in M.items()))
     return M
 
 
-def popular_matching_man_woman(G):
+def popular_matching_man_woman(G, ranks=None):
     """
     computes popular matching in a bipartite graph,
     where man and woman have preferences on each other
     :param G: bipartite graph
+    :param ranks: rank index for G, see graph.rank_index
     :return: popular matching in G
     """
-    G_ = matching_utils.augment_graph(G)
-    M = stable_matching_man_woman(G_)
-    return matching_utils.to_standard_format(M)
+    G_, ranks_ = matching_utils.augmented_view(G, ranks)
+    M = deferred_acceptance(G_, lambda w: 1, ranks_)
+    return matching_utils.from_augmented_assignment(M, single=True)
 
 
-def get_rank(h, r, rank_map):
-    """
-    heapq provides a min heap implementation
-    but the higher ranked vertices are lower
-    priority, fix this by subtracting the rank
-    of the vertex by the length of the pref list
-    :param h: house
-    :param r: resident
-    :param rank_map: dict containing preference list of h
-    :return: rank of r in h's preference list
-    """
-    return len(rank_map[h]) - rank_map[h].index(r)
-
-
-def stable_matching_hospital_residents(G):
+def stable_matching_hospital_residents(G, ranks=None):
     """
     computes stable matching in a bipartite graph,
     where residents and hospitals have preferences on each other
     :param G: bipartite graph
+    :param ranks: rank index for G, see graph.rank_index
     :return: resident optimal stable matching
     """
-    # free_list behaves like a stack
-    M = dict((h, []) for h in G.B)  # assign all hospitals to be totally unsubscribed
-    free_list = [r for r in G.A]  # assign all resident to be free
-    rank_map = copy.deepcopy(G.E)  # we will be modifying G.E, so make a copy
-
-    while free_list:  # while free_list is not empty
-        r = free_list.pop()  # remove a resident from free_list
-        if G.E[r]:  # if r's pref list is not empty
-            h = G.E[r][0]  # first hospital on r's list
-            if len(M[h]) >= graph.upper_quota(G, h):  # h is fully subscribed
-                _, r_ = heapq.heappop(M[h])  # worst resident assigned to h
-                free_list.append(r_)  # assign r_ to be free
-            heapq.heappush(M[h], (get_rank(h, r, rank_map), r))  # assign r to h
-            if len(M[h]) >= graph.upper_quota(G, h):  # h is fully subscribed
-                _, s = M[h][0]  # worst resident provisionally assigned to h
-                graph.update_pref_lists(s, h, G.E, G.E)
+    ranks = graph.rank_index(G, G.B) if ranks is None else ranks
+    M = deferred_acceptance(G, lambda h: graph.upper_quota(G, h), ranks)
 
     # return the matching in a tuple form
     M_ = dict((r, h) for h in M for _, r in M[h])
@@ -118,31 +223,30 @@ def stable_matching_hospital_residents(G):
     return M_
 
 
-def popular_matching_hospital_residents(G):
+def popular_matching_hospital_residents(G, ranks=None):
     """
     computes popular matching in a bipartite graph,
     where residents and hospitals have preferences on each other
     :param G: bipartite graph
+    :param ranks: rank index for G, see graph.rank_index
     :return: popular matching in G
     """
-    G_ = matching_utils.augment_graph(G)
-    M = stable_matching_hospital_residents(G_)
-    return matching_utils.to_standard_format(M)
+    G_, ranks_ = matching_utils.augmented_view(G, ranks)
+    M = deferred_acceptance(G_, lambda h: graph.upper_quota(G_, h), ranks_)
+    return matching_utils.from_augmented_assignment(M)
 
 
 def main():
     if len(sys.argv) < 4:
         print('usage: {} <graph-file> <stable-file> <popular-file>'.format(sys.argv[0]))
     else:
-        import graph_parser, matching_stats
+        import session, matching_stats
         gfile, sfile, pfile = sys.argv[1], sys.argv[2], sys.argv[3]
-        G = graph_parser.read_graph(gfile)
+        S = session.SolveSession.from_file(gfile)
         #M_stable = stable_matching_hospital_residents(G)
         #print(G, M_stable, sep='\n')
-        M_stable = stable_matching_hospital_residents(graph.copy_graph(G))
-        M_popular = popular_matching_hospital_residents(graph.copy_graph(G))
-        matching_stats.print_matching(G, M_stable, sfile)
-        matching_stats.print_matching(G, M_popular, pfile)
+        matching_stats.print_matching(S.G, S.stable_matching(), sfile)
+        matching_stats.print_matching(S.G, S.popular_matching(), pfile)
 
 if __name__ == '__main__':
     main()
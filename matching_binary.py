@@ -0,0 +1,149 @@
+import sys
+import struct
+import hashlib
+import graph
+
+# binary format for a matching in a graph, all integers are little endian
+# header: magic, version, number of residents, and the id of the names
+# table of the graph, followed by the partner (id of the hospital, -1 if
+# unmatched) and the rank of the partner (0 based, -1 if unmatched) of
+# each resident, the ids are those of the compact graph, see graph.CompactGraph
+MAGIC = b'HRM\0'
+VERSION = 1
+header = struct.Struct('<4sIQ16s')
+
+
+def compact(G):
+    return graph.to_compact_graph(G) if isinstance(G, graph.BipartiteGraph) else G
+
+
+def table_id(C):
+    """
+    :param C: compact graph
+    :return: id of the names table of C, the matchings are valid only
+             for the graphs with the same table
+    """
+    h = hashlib.sha256()
+    for names in (C.A.names, C.B.names):
+        h.update('\n'.join(names).encode('utf-8'))
+        h.update(b'\0')
+    return h.digest()[:16]
+
+
+def write_matching(G, M, file_path):
+    """
+    writes the matching M to file_path in the binary format
+    :param G: bipartite graph or compact graph
+    :param M: matching in G
+    :param file_path: path to the output file
+    :return: None
+    """
+    with open(file_path, mode='wb') as fout:
+        fout.write(to_bytes(G, M))
+
+
+def to_bytes(G, M):
+    """
+    :param G: bipartite graph or compact graph
+    :param M: matching in G
+    :return: the matching M in the binary format
+    """
+    import numpy as np
+    import rank_arrays
+    C = compact(G)
+    indexB = graph.name_index(C.B.names)
+    partner = np.fromiter((indexB[M[r]] if r in M else -1 for r in C.A.names),
+                          dtype=np.int64, count=len(C.A.names))
+    res, hos, rank_r = rank_arrays.edge_arrays(C.A)
+    matched = partner[res] == hos
+    rank = np.full(len(partner), -1, dtype=np.int64)
+    rank[res[matched]] = rank_r[matched]
+    return b''.join((header.pack(MAGIC, VERSION, len(partner), table_id(C)),
+                     partner.astype('<i4').tobytes(), rank.astype('<i4').tobytes()))
+
+
+def is_binary_matching(file_path):
+    """
+    :param file_path: path to a matching file
+    :return: True if the file is in the binary format
+    """
+    with open(file_path, mode='rb') as fin:
+        return fin.read(len(MAGIC)) == MAGIC
+
+
+def read_matching_arrays(file_path, G):
+    """
+    reads the matching in file_path as arrays
+    :param file_path: path to the binary matching file
+    :param G: bipartite graph or compact graph the matching was written for
+    :return: partner and rank arrays, see the format above
+    """
+    with open(file_path, mode='rb') as fin:
+        return arrays_from_buffer(fin.read(), G, file_path)
+
+
+def arrays_from_buffer(buf, G, file_path='<buffer>'):
+    """
+    the matching in the binary format in buf as arrays, see read_matching_arrays
+    """
+    import numpy as np
+    C = compact(G)
+    if len(buf) < header.size or bytes(buf[:len(MAGIC)]) != MAGIC:
+        raise ValueError('{}: not a binary matching file'.format(file_path))
+    _, version, n, tid = header.unpack_from(buf)
+    if version != VERSION:
+        raise ValueError('{}: unsupported binary matching version {}'.format(file_path, version))
+    if n != len(C.A.names) or tid != table_id(C):
+        raise ValueError('{}: matching is not for this graph'.format(file_path))
+    if len(buf) < header.size + 8 * n:
+        raise ValueError('{}: truncated binary matching file'.format(file_path))
+    partner = np.frombuffer(buf, dtype='<i4', count=n, offset=header.size).astype(np.int64)
+    rank = np.frombuffer(buf, dtype='<i4', count=n, offset=header.size + 4 * n).astype(np.int64)
+    return partner, rank
+
+
+def read_matching(file_path, G):
+    """
+    reads the matching in file_path
+    :param file_path: path to the binary matching file
+    :param G: bipartite graph or compact graph the matching was written for
+    :return: matching, with M[r] = h and M[h] = {r_1, ..., r_k}
+    """
+    with open(file_path, mode='rb') as fin:
+        return from_buffer(fin.read(), G, file_path)
+
+
+def from_buffer(buf, G, file_path='<buffer>'):
+    """
+    the matching in the binary format in buf, see read_matching
+    """
+    import numpy as np
+    C = compact(G)
+    partner, _ = arrays_from_buffer(buf, C, file_path)
+    residents = np.flatnonzero(partner >= 0)
+    # group the matched residents by their partners
+    order = np.argsort(partner[residents], kind='stable')
+    residents, hospitals = residents[order], partner[residents][order]
+    namesA = np.array(C.A.names, dtype=object)[residents]
+    namesB = np.array(C.B.names, dtype=object)[hospitals]
+
+    M = dict(zip(namesA.tolist(), namesB.tolist()))
+    hids, starts = np.unique(hospitals, return_index=True)
+    ends = np.append(starts[1:], len(hospitals))
+    for h, start, end in zip(hids.tolist(), starts.tolist(), ends.tolist()):
+        M[C.B.names[h]] = set(namesA[start:end].tolist())
+    return M
+
+
+def main():
+    import sea
+    import graph_parser
+    if len(sys.argv) < 4:
+        print('usage: {} <graph file> <matching file> <binary matching file>'.format(sys.argv[0]),
+              file=sys.stderr)
+    else:
+        C = graph_parser.read_graph(sys.argv[1], compact=True)
+        write_matching(C, sea.read_matching(sys.argv[2], C), sys.argv[3])
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,5 @@
 import graph
 import matching_utils
-from tabulate import tabulate
 
 
 def print_graph(G, gfile):
@@ -10,8 +9,7 @@ def print_graph(G, gfile):
     :param gfile: file path to write graph to
     :return: None
     """
-    with open(gfile, mode='w', encoding='utf-8') as out:
-        out.write(graph.graph_to_UTF8_string(G))
+    graph.write_graph_file(G, gfile)
 
 
 def print_matching(G, M, filename):
@@ -39,6 +37,7 @@ def process_stats(stats_file_name, G, matchings):
     :param matchings: see documentation for collect_stats
     :return: None
     """
+    from tabulate import tabulate
     def avg(l):
         return sum(l) / len(l)
 
@@ -49,7 +48,7 @@ def process_stats(stats_file_name, G, matchings):
     table = [['matching desc.', 'matching size', '# unstable pairs',
               'min index', 'max index', 'avg index']]
     for matching in matchings:
-        M = matching['algo'](graph.copy_graph(G))
+        M = matching['algo'](G)
         # print(M)
         indices = get_indices(M)
         table.append([matching['desc'], matching_utils.matching_size(M),
@@ -0,0 +1,135 @@
+import os
+import hashlib
+import tempfile
+import collections
+import graph_binary
+import graph_cache
+
+# version of the code computing each matching, the stored matchings of an
+# algorithm are not used after its version is changed
+ALGORITHMS = {'stable': 1, 'popular': 1, 'max_card': 1}
+
+
+def instance_hash(C):
+    """
+    :param C: compact graph
+    :return: hash of the instance, the same for the graphs with the same
+             vertices, quotas and preference lists however they were read
+    """
+    h = hashlib.sha256()
+    for chunk in graph_binary.binary_graph_chunks(C):
+        h.update(chunk)
+    return h.hexdigest()
+
+
+class MatchingStore:
+    """
+    store of the matchings computed on the instances, keyed by the hash of
+    the instance, the algorithm and its version, the most recently used
+    matchings are kept in memory, up to max_entries matchings and
+    max_vertices vertices in all, and if dirpath is given, all of them are
+    also stored on disk in the binary format, see matching_binary, so that
+    they are shared by the scripts run on the same instances
+    """
+    def __init__(self, dirpath=None, max_entries=64, max_size=1 << 30, max_vertices=1 << 23):
+        """
+        :param dirpath: directory for the matchings on disk, None to keep them in memory only
+        :param max_entries: number of matchings kept in memory
+        :param max_size: maximum size of the directory in bytes
+        :param max_vertices: number of matched vertices in the matchings kept in memory
+        """
+        self.dirpath, self.max_entries, self.max_size = dirpath, max_entries, max_size
+        self.max_vertices, self.vertices = max_vertices, 0
+        self.memory = collections.OrderedDict()
+        self.hits = self.misses = 0
+        if dirpath: os.makedirs(dirpath, exist_ok=True)
+
+    def path(self, key, algorithm):
+        return os.path.join(self.dirpath, '{}-{}-{}.hrm'.format(key, algorithm, ALGORITHMS[algorithm]))
+
+    def get(self, key, algorithm, C):
+        """
+        :param key: hash of the instance, see instance_hash
+        :param algorithm: name of the algorithm, see ALGORITHMS
+        :param C: compact graph of the instance
+        :return: matching stored for the key, None if not present
+        """
+        k = (key, algorithm, ALGORITHMS[algorithm])
+        if k in self.memory:
+            self.memory.move_to_end(k)
+            return self.memory[k]
+        if self.dirpath:
+            import matching_binary
+            try:
+                M = matching_binary.read_matching(self.path(key, algorithm), C)
+                os.utime(self.path(key, algorithm))  # most recently used
+            except (OSError, ValueError):
+                return None
+            self.remember(k, M)
+            return M
+        return None
+
+    def put(self, key, algorithm, C, M):
+        """
+        stores the matching for the key
+        :param key: hash of the instance, see instance_hash
+        :param algorithm: name of the algorithm, see ALGORITHMS
+        :param C: compact graph of the instance
+        :param M: matching computed by the algorithm
+        :return: None
+        """
+        self.remember((key, algorithm, ALGORITHMS[algorithm]), M)
+        if self.dirpath:
+            import matching_binary
+            # write to a temporary file first, so that readers never see a partial file
+            fd, tmp_path = tempfile.mkstemp(dir=self.dirpath, suffix='.tmp')
+            os.close(fd)
+            try:
+                matching_binary.write_matching(C, M, tmp_path)
+                os.replace(tmp_path, self.path(key, algorithm))
+            finally:
+                if os.path.exists(tmp_path): os.remove(tmp_path)
+            graph_cache.evict(self.dirpath, '.hrm', self.max_size)
+
+    def remember(self, k, M):
+        if k in self.memory:
+            self.vertices -= len(self.memory[k])
+        self.memory[k] = M
+        self.memory.move_to_end(k)
+        self.vertices += len(M)
+        while len(self.memory) > self.max_entries or self.vertices > self.max_vertices:
+            self.vertices -= len(self.memory.popitem(last=False)[1])
+
+    def matching(self, key, algorithm, C, fn):
+        """
+        :param key: hash of the instance, see instance_hash
+        :param algorithm: name of the algorithm, see ALGORITHMS
+        :param C: compact graph of the instance
+        :param fn: function computing the matching if it is not stored
+        :return: matching, the stored matchings are shared and must not be modified
+        """
+        M = self.get(key, algorithm, C)
+        if M is not None:
+            self.hits += 1
+            return M
+        self.misses += 1
+        M = fn()
+        self.put(key, algorithm, C, M)
+        return M
+
+
+_default_store = None
+
+
+def default_store():
+    """
+    the store is enabled by setting HR_MATCHING_STORE to the store directory,
+    and HR_MATCHING_STORE_SIZE to its maximum size in megabytes
+    :return: MatchingStore shared by the sessions in this process, None if the store is not enabled
+    """
+    global _default_store
+    dirpath = os.environ.get('HR_MATCHING_STORE')
+    if not dirpath: return None
+    if _default_store is None or _default_store.dirpath != dirpath:
+        _default_store = MatchingStore(dirpath, max_size=int(os.environ.get('HR_MATCHING_STORE_SIZE', 1024)) << 20)
+    return _default_store
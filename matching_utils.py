@@ -1,9 +1,12 @@
 import graph
-import matching_algos
 import copy
+import bisect
 import collections
+import collections.abc
 
 Vertex = collections.namedtuple('Vertex', ['id', 'level'])
+# dummy hospital d(r) in the lazily augmented graph, see augmented_view
+Dummy = collections.namedtuple('Dummy', ['id'])
 
 
 def blow_house_instances(G):
@@ -138,6 +141,171 @@ def augment_graph(G):
     return graph.BipartiteGraph(A_, B_, E_, capacities)
 
 
+class ResidentLevelList(collections.abc.Sequence):
+    """
+    preference list of the resident r in G', computed on the fly,
+    see preflist_resident
+    """
+    def __init__(self, r, pref_list):
+        self.r, self.pref_list = r, pref_list
+
+    def __len__(self):
+        return len(self.pref_list) + 1
+
+    def __getitem__(self, i):
+        if not 0 <= i < len(self): raise IndexError(i)
+        if self.r.level == 1:  # d(r) followed by the original preference list
+            return Dummy(self.r.id) if i == 0 else self.pref_list[i-1]
+        # original preference list followed by d(r)
+        return self.pref_list[i] if i < len(self.pref_list) else Dummy(self.r.id)
+
+
+class HospitalLevelList(collections.abc.Sequence):
+    """
+    preference list of a hospital in G', computed on the fly,
+    level 1 residents followed by level 0 residents, see preflist_hospital
+    """
+    def __init__(self, pref_list):
+        self.pref_list = pref_list
+
+    def __len__(self):
+        return 2 * len(self.pref_list)
+
+    def __getitem__(self, i):
+        if not 0 <= i < len(self): raise IndexError(i)
+        n = len(self.pref_list)
+        return Vertex(self.pref_list[i], 1) if i < n else Vertex(self.pref_list[i-n], 0)
+
+
+class HospitalLevelRanks(collections.abc.Mapping):
+    """
+    ranks of the residents in G' on a hospital's preference list,
+    derived from the ranks in the original graph
+    """
+    def __init__(self, rank):
+        self.rank = rank
+
+    def __getitem__(self, r):
+        # level 1 residents are preferred to all level 0 residents
+        return self.rank[r.id] + (0 if r.level == 1 else len(self.rank))
+
+    def __iter__(self):
+        for level in (1, 0):
+            for r in self.rank: yield Vertex(r, level)
+
+    def __len__(self):
+        return 2 * len(self.rank)
+
+
+class AugmentedPreferences(collections.abc.Mapping):
+    """
+    preference lists in G' computed on the fly from G
+    """
+    def __init__(self, G):
+        self.G = G
+
+    def __getitem__(self, u):
+        if isinstance(u, Vertex): return ResidentLevelList(u, self.G.E[u.id])
+        if isinstance(u, Dummy): return preflist_dummy(u.id)
+        return HospitalLevelList(self.G.E.get(u, []))
+
+    def __iter__(self):
+        for level in (0, 1):
+            for r in self.G.A: yield Vertex(r, level)
+        for r in self.G.A: yield Dummy(r)
+        for h in self.G.B:
+            if h in self.G.E: yield h
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+
+class AugmentedRanks(collections.abc.Mapping):
+    """
+    rank index for the hospitals in G', see graph.rank_index
+    """
+    def __init__(self, ranks):
+        self.ranks = ranks
+
+    def __getitem__(self, h):
+        if isinstance(h, Dummy): return {Vertex(h.id, 0): 0, Vertex(h.id, 1): 1}
+        return HospitalLevelRanks(self.ranks[h])
+
+    def __iter__(self):
+        return iter(self.ranks)
+
+    def __len__(self):
+        return len(self.ranks)
+
+
+class AugmentedHospitals(collections.abc.Set):
+    """
+    partition B' in G', the hospitals in G and a dummy d(r) for every r
+    """
+    def __init__(self, G):
+        self.G = G
+
+    def __contains__(self, h):
+        return h.id in self.G.A if isinstance(h, Dummy) else h in self.G.B
+
+    def __iter__(self):
+        yield from self.G.B
+        for r in self.G.A: yield Dummy(r)
+
+    def __len__(self):
+        return len(self.G.A) + len(self.G.B)
+
+
+class AugmentedCapacities(collections.abc.Mapping):
+    """
+    capacities in G', dummy hospitals have capacity 1
+    """
+    def __init__(self, G):
+        self.G = G
+
+    def __getitem__(self, u):
+        if isinstance(u, Dummy): return 0, 1
+        return self.G.capacities[u.id if isinstance(u, Vertex) else u]
+
+    def __iter__(self):
+        yield from AugmentedPreferences(self.G)
+
+    def __len__(self):
+        return len(AugmentedPreferences(self.G))
+
+
+def augmented_view(G, ranks=None):
+    """
+    a view of the graph G' described in augment_graph, only the
+    level 0 and level 1 copies of the residents are materialized, the
+    dummies and the preference lists are computed on the fly from G
+    :param G: bipartite graph G
+    :param ranks: rank index for the hospitals in G, see graph.rank_index
+    :return: augmented graph G', and the rank index for its hospitals
+    """
+    ranks = graph.rank_index(G, G.B) if ranks is None else ranks
+    A_ = [Vertex(r, 0) for r in G.A] + [Vertex(r, 1) for r in G.A]
+    G_ = graph.BipartiteGraph(A_, AugmentedHospitals(G), AugmentedPreferences(G),
+                              AugmentedCapacities(G))
+    return G_, AugmentedRanks(ranks)
+
+
+def from_augmented_assignment(assigned, single=False):
+    """
+    matching in G from the assignment computed in the augmented
+    view of G, residents matched to their dummies are left unmatched
+    :param assigned: dict h -> heap of (rank, r), see matching_algos.deferred_acceptance
+    :param single: True if the hospitals have a single partner
+    :return: matching in standard format, see to_standard_format
+    """
+    M = {}
+    for h, heap in assigned.items():
+        if isinstance(h, Dummy) or not heap: continue
+        for _, r in heap: M[r.id] = h
+        M[h] = heap[0][1].id if single else set(r.id for _, r in heap)
+    return M
+
+
 def to_standard_format(M):
     """
     create a dict such that the matched partner(s)
@@ -175,18 +343,21 @@ def partners_iterable(G, M, u):
     return M_u if isinstance(M_u, set) else [M_u]
 
 
-def unstable_pairs(G, M):
+def unstable_pairs(G, M, ranks=None):
     """
     finds the unstable pairs in G w.r.t matching M,
     hospital residents instance
     :param G: bipartite graph
     :param M: matching in G
+    :param ranks: rank index for G, see graph.rank_index
     :return: list of the unstable pairs
     """
+    ranks = graph.rank_index(G) if ranks is None else ranks
+
     # the least preferred partner this vertex is matched to
     def worst_partner(partners, u):
         # order according to preference list
-        return sorted(partners, key=G.E[u].index)[-1] if partners else None
+        return max(partners, key=ranks[u].__getitem__) if partners else None
 
     # does a prefer b over c
     def prefers(a, b, c):
@@ -195,7 +366,7 @@ def unstable_pairs(G, M):
         if b is None: return False  # false if b is None
         if c is None: return True  # true if c is None
         # check their relative ordering in a's pref list
-        return G.E[a].index(b) < G.E[a].index(c)
+        return ranks[a][b] < ranks[a][c]
 
     # mapping of hospitals to their least preferred neighbors in M
     least_preferred = dict((u, worst_partner(partners_iterable(G, M, u), u)) for u in G.B)
@@ -205,7 +376,7 @@ def unstable_pairs(G, M):
         pref_list = G.E[a]
         # we check all the pairs upto the matched partner of a
         # if it is not matched, check all the vertices in pref_list
-        matched_partner_index = pref_list.index(M[a]) if a in M else len(pref_list)
+        matched_partner_index = ranks[a][M[a]] if a in M else len(pref_list)
         index = 0
         # while a prefers someone to its matched partner in pref_list
         while index < matched_partner_index:
@@ -218,70 +389,80 @@ def unstable_pairs(G, M):
     return upairs
 
 
-def envy_pairs(G, M):
+def in_partition_order(G, pairs):
+    """
+    sort pairs of residents in the order in which G.A is iterated
+    :param G: bipartite graph
+    :param pairs: list of pairs (a1, a2) of residents
+    :return: sorted list of pairs
+    """
+    position = dict((a, i) for i, a in enumerate(G.A))
+    return sorted(pairs, key=lambda p: (position[p[0]], position[p[1]]))
+
+
+def envy_pairs(G, M, ranks=None, count_only=False):
     """
     finds the envy pairs in G w.r.t matching M,
     hospital residents instance
     :param G: bipartite graph
     :param M: matching in G
-    :return: list of the unstable pairs
+    :param ranks: rank index for G, see graph.rank_index
+    :param count_only: return only the number of envy pairs
+    :return: list of the envy pairs (a1, a2), a1 envies a2
     """
-    # mark the pairs that have been processed
-    # so that we do not end up with duplicates
-    processed_pairs = set()
-    epairs = []  # envy pairs
-
-    for a1 in G.A:  # for each vertex in A
-        for a2 in G.A:
-            # if we haven't processed this pair already
-            if a1 != a2 and (a1, a2) not in processed_pairs:
-                processed_pairs.add((a1, a2))
-                if a1 in M and a2 in M: # if a1 and a2 are matched in M
-                    h = M.get(a2)
-
-                    # a1 provides preference for h
-                    if (G.E[a1].count(h) != 0 and
-                        # a1 is unmatched or prefers h over M[a1]
-                        (a1 not in M or G.E[a1].index(h) < G.E[a1].index(M[a1])) and
-                        # h prefers a1 over a2
-                        G.E[h].index(a1) < G.E[h].index(a2)):
-                            epairs.append((a1, a2))
-
-    return epairs
-
-
-def exchange_blocking_pairs(G, M):
+    ranks = graph.rank_index(G) if ranks is None else ranks
+
+    # residents assigned to each hospital, ordered by the hospital's preference
+    assigned = collections.defaultdict(list)
+    for a in G.A:
+        if a in M:
+            assigned[M[a]].append((ranks[M[a]][a], a))
+
+    count, epairs = 0, []
+    for h, residents in assigned.items():
+        residents.sort()
+        hranks = [rank for rank, _ in residents]
+        # a1 envies the residents at h that h ranks below a1,
+        # if a1 is matched and prefers h over M[a1]
+        for a1 in G.E[h]:
+            rank_h = ranks[a1].get(h)
+            if a1 not in M or rank_h is None or rank_h >= ranks[a1][M[a1]]: continue
+            i = bisect.bisect_right(hranks, ranks[h][a1])
+            count += len(residents) - i
+            if not count_only:
+                epairs.extend((a1, a2) for _, a2 in residents[i:])
+
+    return count if count_only else in_partition_order(G, epairs)
+
+
+def exchange_blocking_pairs(G, M, ranks=None, count_only=False):
     """
     finds exchange blocking pairs in M
     :param G: bipartite graph
     :param M: matching in G
+    :param ranks: rank index for G, see graph.rank_index
+    :param count_only: return only the number of exchange blocking pairs
+    :return: list of the exchange blocking pairs (a1, a2)
     """
+    ranks = graph.rank_index(G, G.A) if ranks is None else ranks
 
-    # mark the pairs that have been processed
-    # so that we do not end up with duplicates
-    processed_pairs = set()
-    exchange_blocking = []
-
-    for a1 in G.A:
-        for a2 in G.A:
-            # if we haven't processed this pair already
-            if a1 != a2 and (a1, a2) not in processed_pairs:
-                processed_pairs.add((a1, a2))
-
-                # get partners for a1 and a2
-                b1 = M.get(a1, None)
-                b2 = M.get(a2, None)
+    # residents matched to b1 that prefer b2 over b1
+    envious = collections.defaultdict(list)
+    for a in G.A:
+        b = M.get(a)
+        if b is not None:
+            for b_ in G.E[a][:ranks[a][b]]:
+                envious[(b, b_)].append(a)
 
-                # both a1 and a2 have a non-null partner
-                if b1 is not None and b2 is not None:
-                    # a1 and a2 provide preference for b2 and b1 respectively
-                    if G.E[a1].count(b2) != 0 and G.E[a2].count(b1) != 0:
-                        # do a1 and a2 prefer each others partner over their own
-                        if (G.E[a1].index(b1) > G.E[a1].index(b2) and
-                            G.E[a2].index(b2) > G.E[a2].index(b1)):
-                            exchange_blocking.append((a1, a2))
+    # a1 and a2 prefer each others partner over their own
+    count, exchange_blocking = 0, []
+    for (b1, b2), residents in envious.items():
+        others = envious.get((b2, b1), ())
+        count += len(residents) * len(others)
+        if not count_only:
+            exchange_blocking.extend((a1, a2) for a1 in residents for a2 in others)
 
-    return exchange_blocking
+    return count if count_only else in_partition_order(G, exchange_blocking)
 
 
 def matching_size(G, M):
@@ -318,6 +499,6 @@ def is_max_card_matching(G, M):
     :param M: a matching in G
     :return: true if M is a max-cardinality matching in G, false otherwise
     """
-    M_max = matching_algos.max_card_hospital_residents(G)
-    return matching_size(G, M) == matching_size(G, M_max)
+    import session
+    return session.SolveSession(G).is_max_card_matching(M)
 
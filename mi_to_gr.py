@@ -1,13 +1,21 @@
 import os
-import sys
+import argparse
+import concurrent.futures
 import graph
+import graph_binary
 
 
 def readline(rdr):
     return rdr.readline().strip()
 
 
-def read_graph(rdr):
+def read_graph(rdr, compact=False):
+    """
+    reads a graph in the Matchu format
+    :param rdr: file object
+    :param compact: return a compact graph instead of a bipartite graph
+    :return: graph described in the file
+    """
     n_1 = int(readline(rdr))  # number of residents
     n_2 = int(readline(rdr))  # number of hospitals
     _ = readline(rdr)  # number of couples
@@ -20,53 +28,79 @@ def read_graph(rdr):
     _ = readline(rdr)  # skip empty line
 
     # read the preferences of the residents
-    A, E = set(), {}
-    capacities = {}
+    pref_listsA, capacities = [], {}
     for i in range(n_1):
         data = readline(rdr).split()
         u = 'r{}'.format(data[0])
         # pref list for couples may contains duplicate
         # do not include them more than once in the original order
-        pref_list = []
-        for h in data[1:]:
-            h_rep = 'h{}'.format(h)
-            if h_rep not in pref_list:
-                pref_list.append(h_rep)
-        A.add(u)  # add this vertex to partition A
-        E[u] = pref_list  # set its preference list
+        pref_list = list(dict.fromkeys('h{}'.format(h) for h in data[1:]))
+        pref_listsA.append((u, pref_list))
         capacities[u] = (0, 1)
 
     _ = readline(rdr)  # skip empty line
 
     # read the preferences of the hospitals
-    B = set()
+    pref_listsB = []
     for i in range(n_2):
         data = readline(rdr).split()
-        u, capacity, = 'h{}'.format(data[0]), int(data[1])
-        pref_list = ['r{}'.format(r) for r in data[2:]]
-        B.add(u)  # add this vertex to partition B
-        E[u] = pref_list  # set its preference list
+        u = 'h{}'.format(data[0])
+        pref_listsB.append((u, ['r{}'.format(r) for r in data[2:]]))
         capacities[u] = (0, int(data[1]))
 
-    return graph.BipartiteGraph(A, B, E, capacities)
+    A = set(u for u, _ in pref_listsA)
+    B = set(u for u, _ in pref_listsB)
+    if compact:
+        return graph.make_compact_graph(A, B, pref_listsA, pref_listsB, capacities)
+    return graph.make_graph(A, B, pref_listsA, pref_listsB, capacities)
 
 
-def process_directory(indirpath, outdirpath):
-    for entry in os.scandir(indirpath):
-        outpath = os.path.join(outdirpath, ''.join(entry.name.split()))
-        
-        # write to our format
-        with open(entry.path, encoding='utf-8', mode='r') as rdr:
-            G = read_graph(rdr)
-            with open(outpath, encoding='utf-8', mode='w') as out:
-                out.write(graph.graph_to_UTF8_string(G))
+def convert_file(inpath, outpath, binary=False):
+    """
+    converts the graph in inpath to our text format, or to the
+    binary format without going through the text format
+    :param inpath: path to the graph in the Matchu format
+    :param outpath: path to the output file
+    :param binary: write the binary format, see graph_binary
+    :return: outpath
+    """
+    with open(inpath, encoding='utf-8', mode='r') as rdr:
+        G = read_graph(rdr, compact=binary)
+    if binary:
+        graph_binary.write_binary_graph(G, outpath)
+    else:
+        graph.write_graph_file(G, outpath)
+    return outpath
 
 
-def main():
-    if len(sys.argv) < 3:
-        print('usage: {} <indirpath> <outdirpath>'.format(sys.argv[0]))
+def process_directory(indirpath, outdirpath, binary=False, workers=1):
+    """
+    converts every graph in indirpath, see convert_file
+    :param indirpath: directory with the graphs in the Matchu format
+    :param outdirpath: directory for the converted graphs
+    :param binary: write the binary format
+    :param workers: number of processes converting the graphs
+    :return: None
+    """
+    jobs = [(entry.path, os.path.join(outdirpath, ''.join(entry.name.split())), binary)
+            for entry in os.scandir(indirpath) if entry.is_file()]
+    if workers == 1:
+        for job in jobs: convert_file(*job)
     else:
-        process_directory(sys.argv[1], sys.argv[2])
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+            for future in [executor.submit(convert_file, *job) for job in jobs]:
+                future.result()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='convert graphs in the Matchu format to our format')
+    parser.add_argument('indirpath', help='directory with the graphs in the Matchu format')
+    parser.add_argument('outdirpath', help='directory for the converted graphs')
+    parser.add_argument('-b', dest='binary', action='store_true', help='write the binary format')
+    parser.add_argument('-j', dest='workers', type=int, default=os.cpu_count(),
+                        help='number of processes, all the cores by default', metavar='')
+    args = parser.parse_args()
+    process_directory(args.indirpath, args.outdirpath, args.binary, args.workers)
 
 
 if __name__ == '__main__':
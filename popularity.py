@@ -0,0 +1,386 @@
+import sys
+import bisect
+import collections
+import graph
+import matching_utils
+
+# a hospital compares two matchings N and M by pairing up the residents it has
+# in only one of them, a pair votes for the matching with the better resident,
+# and a resident with no pair votes for its matching, M is popular if no
+# feasible matching N gets more votes than M for any such pairing
+#
+# a move is a resident r leaving M(r) for a hospital h, and h making room by
+# dropping a resident y in M(h) if it is full, weighted by the votes of r and
+# h for the move, 2, 0 or -2, a (-, -) move is left out unless h is at its
+# lower quota, as y may as well leave h without being replaced, M is popular
+# iff there is no
+#   cycle of moves with a positive weight, or
+#   path of moves with a positive weight, counting -1 for the resident it
+#   starts at if it leaves a hospital h, which must be above its lower quota,
+#   and -1 for the resident dropped at its end, if it does not end at an
+#   under-subscribed hospital, which must not be h
+
+# a matching more popular than M, and its margin over M, see margin
+Unpopularity = collections.namedtuple('Unpopularity', ['kind', 'matching', 'margin'])
+
+# kinds of the witnesses, a path from an unmatched resident, or from a
+# matched resident to an under-subscribed hospital, or to a dropped resident
+CYCLE, PATH_FROM_UNMATCHED, PATH_TO_UNDERSUBSCRIBED, TWO_MOVES = \
+    'cycle', 'path from unmatched', 'path to under-subscribed', 'two moves'
+
+
+def margin(G, N, M, ranks=None):
+    """
+    :param G: bipartite graph
+    :param N: matching in G
+    :param M: matching in G
+    :param ranks: rank index for G, see graph.rank_index
+    :return: votes for N less the votes for M, with the residents of each
+             hospital paired up in the way most favourable to N, see graph.pairing_vote
+    """
+    return sum(vote for _, vote in graph.compare_matchings(G, N, M, ranks))
+
+
+class MoveGraph:
+    """
+    directed graph of the moves w.r.t M, a resident r has an edge to a gate of
+    each hospital h it can move to, a gate of h leads to the residents h can drop
+    for r, for the residents worse than r (h votes +) or better than r (h votes -),
+    and an under-subscribed hospital also has a sink, reached when h takes r
+    without dropping anyone, the edge of r is weighted by the votes of r and h
+    """
+    def __init__(self, G, M, ranks):
+        self.G, self.M = G, M
+        self.nodes = []  # ('r', r), ('+', h, j), ('-', h, j), or ('t', h)
+        self.adj, self.weight = [], []
+        index = {}
+
+        def node(key):
+            if key not in index:
+                index[key] = len(self.nodes)
+                self.nodes.append(key)
+                self.adj.append([])
+                self.weight.append([])
+            return index[key]
+
+        # sorted, so that the witnesses do not depend on the order of the sets
+        for r in sorted(G.A):
+            node(('r', r))
+        matched, matched_ranks, sinks, tight = {}, {}, set(), set()
+        for h in sorted(G.B):
+            matched[h] = sorted(matching_utils.partners_iterable(G, M, h), key=ranks[h].__getitem__)
+            matched_ranks[h] = [ranks[h][y] for y in matched[h]]
+            for j, y in enumerate(matched[h]):
+                for sign, step in (('+', 1), ('-', -1)):
+                    self.add(node((sign, h, j)), node(('r', y)), 0)
+                    if 0 <= j + step < len(matched[h]):
+                        self.add(node((sign, h, j)), node((sign, h, j + step)), 0)
+            if len(matched[h]) < graph.upper_quota(G, h):
+                sinks.add(h)
+            if len(matched[h]) <= graph.lower_quota(G, h):
+                tight.add(h)
+        # the residents a path may start at, with the hospitals they leave
+        self.starts = [(index[('r', r)], M.get(r)) for r in sorted(G.A) if M.get(r) not in tight]
+
+        for r in sorted(G.A):
+            u, M_r = node(('r', r)), M.get(r)
+            for h in G.E[r]:
+                if h == M_r or r not in ranks[h]: continue
+                vote_r = 1 if M_r is None or ranks[r][h] < ranks[r][M_r] else -1
+                # matched[h][j:] are worse than r for h
+                j = bisect.bisect_left(matched_ranks[h], ranks[h][r])
+                if j < len(matched[h]):
+                    self.add(u, node(('+', h, j)), vote_r + 1)
+                if j > 0 and (vote_r > 0 or h in tight):
+                    self.add(u, node(('-', h, j - 1)), vote_r - 1)
+                if h in sinks:
+                    self.add(u, node(('t', h)), vote_r + 1)
+
+    def add(self, u, v, weight):
+        self.adj[u].append(v)
+        self.weight[u].append(weight)
+
+    def edges(self, u):
+        return zip(self.adj[u], self.weight[u])
+
+    def components(self):
+        """
+        strongly connected components, by Tarjan's algorithm without recursion
+        :return: component of every node, the components are numbered in
+                 reverse topological order, every edge goes to the same or
+                 a lower numbered component
+        """
+        n = len(self.nodes)
+        comp, low, num = [-1] * n, [0] * n, [-1] * n
+        stack, counter, ncomp = [], 0, 0
+        for root in range(n):
+            if num[root] >= 0: continue
+            work = [(root, 0)]
+            while work:
+                v, i = work.pop()
+                if i == 0:
+                    num[v] = low[v] = counter
+                    counter += 1
+                    stack.append(v)
+                elif comp[self.adj[v][i - 1]] < 0:
+                    low[v] = min(low[v], low[self.adj[v][i - 1]])
+                while i < len(self.adj[v]):
+                    w = self.adj[v][i]
+                    i += 1
+                    if num[w] < 0:
+                        work.append((v, i))
+                        work.append((w, 0))
+                        break
+                    if comp[w] < 0:
+                        low[v] = min(low[v], num[w])
+                else:
+                    if low[v] == num[v]:
+                        while True:
+                            w = stack.pop()
+                            comp[w] = ncomp
+                            if w == v: break
+                        ncomp += 1
+        return comp, ncomp
+
+    def search(self, starts, goal, allowed=None):
+        """
+        breadth first search
+        :param starts: nodes to start from
+        :param goal: function taking a node, and returning True if the search should stop
+        :param allowed: function taking a node, and returning True if it may be visited
+        :return: path from a start to a goal node, None if there is none
+        """
+        parent = dict((s, None) for s in starts)
+        queue = collections.deque(starts)
+        while queue:
+            v = queue.popleft()
+            if goal(v):
+                path = []
+                while v is not None:
+                    path.append(v)
+                    v = parent[v]
+                return path[::-1]
+            for w in self.adj[v]:
+                if w not in parent and (allowed is None or allowed(w)):
+                    parent[w] = v
+                    queue.append(w)
+        return None
+
+    def positive_cycle(self, nodes, comp):
+        """
+        looks for a cycle of positive weight by the Bellman-Ford algorithm,
+        checking the tree of the longest walks for a cycle after every
+        len(nodes) updates
+        :param nodes: nodes of a strongly connected component
+        :param comp: component of every node, see components
+        :return: cycle with its first node repeated at the end, None if there is none
+        """
+        c = comp[nodes[0]]
+        dist, parent = dict((v, 0) for v in nodes), dict((v, None) for v in nodes)
+        queue, queued, updates = collections.deque(nodes), set(nodes), 0
+        while queue:
+            v = queue.popleft()
+            queued.discard(v)
+            for w, weight in self.edges(v):
+                if comp[w] != c or dist[v] + weight <= dist[w]: continue
+                dist[w], parent[w] = dist[v] + weight, v
+                if w not in queued:
+                    queue.append(w)
+                    queued.add(w)
+                updates += 1
+                if updates % len(nodes) == 0:
+                    cycle = parent_cycle(parent, nodes)
+                    if cycle is not None: return cycle
+        return None
+
+    def apply(self, path):
+        """
+        :param path: nodes of a path of moves, or a cycle with its first node repeated at the end
+        :return: the matching obtained from M by making the moves
+        """
+        N = dict((u, set(M_u) if isinstance(M_u, set) else M_u) for u, M_u in self.M.items())
+        residents = [self.nodes[v][1] for v in path if self.nodes[v][0] == 'r']
+        for r in residents:
+            h = N.pop(r, None)
+            if h is not None: N[h].discard(r)
+        for u, v in zip(path, path[1:]):
+            if self.nodes[u][0] == 'r' and self.nodes[v][0] != 'r':
+                r, h = self.nodes[u][1], self.nodes[v][1]
+                N[r] = h
+                N.setdefault(h, set()).add(r)
+        for h in [h for h in self.G.B if h in N and not N[h]]:
+            del N[h]
+        return N
+
+
+def parent_cycle(parent, nodes):
+    """
+    :param parent: dict node -> parent node, None for a root
+    :param nodes: nodes to look for a cycle from
+    :return: cycle of the parent edges, reversed to follow the edges of the
+             graph, with its first node repeated at the end, None if there is none
+    """
+    visited = {}
+    for s in nodes:
+        path, v = [], s
+        while v is not None and v not in visited:
+            visited[v] = s
+            path.append(v)
+            v = parent[v]
+        if v is not None and visited[v] == s:
+            return [v] + path[path.index(v):][::-1]
+    return None
+
+
+def offer(entries, e):
+    """
+    keeps the best walks to a node for two different labels
+    :param entries: entries of the node, best first
+    :param e: entry (value, label, node, previous entry) of a walk to the node
+    :return: True if the entries were changed
+    """
+    for i, f in enumerate(entries):
+        if f[1] == e[1]:
+            if e[0] <= f[0]: return False
+            entries[i] = e
+            break
+    else:
+        if len(entries) == 2 and e[0] <= entries[1][0]: return False
+        entries.append(e)
+    entries.sort(key=lambda f: -f[0])
+    del entries[2:]
+    return True
+
+
+def walk_path(e):
+    """
+    :param e: entry of a walk, see offer
+    :return: nodes of the walk with its cycles removed
+    """
+    walk = []
+    while e is not None:
+        walk.append(e[2])
+        e = e[3]
+    path, position = [], {}
+    for v in reversed(walk):
+        if v in position:
+            for x in path[position[v] + 1:]: del position[x]
+            del path[position[v] + 1:]
+        else:
+            position[v] = len(path)
+            path.append(v)
+    return path
+
+
+def unpopularity(G, M, ranks=None):
+    """
+    decides if M is popular in G, in O(n + m) time for the n nodes and m
+    edges of the moves, which are linear in the size of G, if no strongly
+    connected component of the moves has a (-, -) move, as when no hospital
+    is at a positive lower quota, otherwise the components with a (-, -)
+    move are searched by the Bellman-Ford algorithm, in O(n m) time
+    :param G: bipartite graph
+    :param M: feasible matching in G
+    :param ranks: rank index for G, see graph.rank_index
+    :return: None if M is popular, otherwise Unpopularity with a feasible matching more popular than M
+    """
+    ranks = graph.rank_index(G) if ranks is None else ranks
+    D = MoveGraph(G, M, ranks)
+    comp, ncomp = D.components()
+    members, inner = [[] for _ in range(ncomp)], [set() for _ in range(ncomp)]
+    for u in range(len(D.nodes)):
+        members[comp[u]].append(u)
+        inner[comp[u]].update(weight for w, weight in D.edges(u) if comp[w] == comp[u])
+
+    def witness(kind, path):
+        N = D.apply(path)
+        if not matching_utils.is_feasible(G, N):
+            raise ValueError('{} witness is not a feasible matching, is M feasible?'.format(kind))
+        return Unpopularity(kind, N, margin(G, N, M, ranks))
+
+    # a cycle of positive weight, any cycle through a (+, +) move if there is no (-, -) move
+    for c in range(ncomp):
+        if 2 not in inner[c]: continue
+        if -2 in inner[c]:
+            cycle = D.positive_cycle(members[c], comp)
+            if cycle is not None: return witness(CYCLE, cycle)
+            continue
+        u, v = next((u, w) for u in members[c] for w, weight in D.edges(u) if weight == 2 and comp[w] == c)
+        return witness(CYCLE, D.search([v], lambda x: x == u, allowed=lambda x: comp[x] == c) + [v])
+
+    # the best walks from the starts, labelled by the hospital left at the start,
+    # to every node, the components are visited in topological order
+    best = [[] for _ in D.nodes]
+    for u, h in D.starts:
+        offer(best[u], (0 if h is None else -1, h, u, None))
+    for c in reversed(range(ncomp)):
+        if -2 in inner[c]:
+            queue = collections.deque(u for u in members[c] if best[u])
+            queued = set(queue)
+            while queue:
+                u = queue.popleft()
+                queued.discard(u)
+                for w, weight in D.edges(u):
+                    if comp[w] != c: continue
+                    for e in list(best[u]):
+                        if offer(best[w], (e[0] + weight, e[1], w, e)) and w not in queued:
+                            queue.append(w)
+                            queued.add(w)
+        elif len(members[c]) > 1:
+            # the moves inside the component have weight 0, every node gets the best walks to any of them
+            entries = []
+            for u in members[c]:
+                for e in best[u]: offer(entries, e)
+            for e in entries:
+                reached, queue = {e[2]: e}, collections.deque([e[2]])
+                while queue:
+                    u = queue.popleft()
+                    for w in D.adj[u]:
+                        if comp[w] == c and w not in reached:
+                            reached[w] = (e[0], e[1], w, reached[u])
+                            offer(best[w], reached[w])
+                            queue.append(w)
+        for u in members[c]:
+            for w, weight in D.edges(u):
+                if comp[w] != c:
+                    for e in best[u]: offer(best[w], (e[0] + weight, e[1], w, e))
+
+    # a path of positive weight
+    for v, key in enumerate(D.nodes):
+        for e in best[v]:
+            if key[0] == 'r' and e[3] is not None and e[0] > 1:
+                return witness(PATH_FROM_UNMATCHED if e[1] is None else TWO_MOVES, walk_path(e))
+            if key[0] == 't' and e[1] != key[1] and e[0] > 0:
+                return witness(PATH_FROM_UNMATCHED if e[1] is None else PATH_TO_UNDERSUBSCRIBED, walk_path(e))
+    return None
+
+
+def is_popular(G, M, ranks=None):
+    """
+    :param G: bipartite graph
+    :param M: matching in G
+    :param ranks: rank index for G, see graph.rank_index
+    :return: True if M is popular in G, see unpopularity
+    """
+    return unpopularity(G, M, ranks) is None
+
+
+def main():
+    import sea
+    import session
+    if len(sys.argv) < 3:
+        print('usage: {} <graph file> <matching file>'.format(sys.argv[0]), file=sys.stderr)
+        return
+    S = session.SolveSession.from_file(sys.argv[1])
+    M = sea.read_matching(sys.argv[2], S.compact)
+    U = S.unpopularity(M)
+    if U is None:
+        print('popular')
+    else:
+        print('not popular, {} gives a matching with margin {}'.format(U.kind, U.margin))
+        for r in S.G.A:
+            if U.matching.get(r) != M.get(r):
+                print('{}: {} -> {}'.format(r, M.get(r), U.matching.get(r)))
+
+if __name__ == '__main__':
+    main()
@@ -1,7 +1,6 @@
 import graph
 import collections
 import random
-import numpy as np
 import matching_algos
 
 
@@ -102,6 +101,7 @@ def mahadian_k_model_generator_man_woman(n1, n2, k):
     :param k: length of preference list for vertices in A
     :return: bipartite graph with above properties
     """
+    import numpy as np
     # create the sets M and W, m_1 ... m_n1, w_1 .. w_n2
     M = list('m{}'.format(i) for i in range(1, n1+1))
     W = list('w{}'.format(i) for i in range(1, n2+1))
@@ -146,6 +146,7 @@ def mahadian_k_model_generator_hospital_residents(n1, n2, k, cap):
     :param cap: capacity of the hospitals
     :return: bipartite graph with above properties
     """
+    import numpy as np
     def order_by_master_list(l, master_list):
         return sorted(l, key=master_list.index)
 
@@ -234,7 +235,7 @@ def feasibility_check(G):
         #print(graph.to_easy_format(G1, Max_M))
       
         if check_on_max_card_matching(G1, Max_M):
-            M = matching_algos.stable_matching_hospital_residents(graph.copy_graph(G))
+            M = matching_algos.stable_matching_hospital_residents(G)
             #print("-------------stable_mat----------\n")
             #print(graph.to_easy_format(G, M))
             for h in G.B:
@@ -271,7 +272,8 @@ def main():
             # G = random_model_generator(n1, n2, k, max_capacity)
             G = mahadian_k_model_generator_hospital_residents(n1, n2, k, max_capacity)
         
-        print(graph.graph_to_UTF8_string(G), file=sys.stdout)
+        graph.write_graph(G, sys.stdout)
+        print(file=sys.stdout)
         
       #  print(graph.graph_to_UTF8_string(G), file=sys.stdout)
       #  sum_of_lower_quotas=0
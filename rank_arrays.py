@@ -0,0 +1,217 @@
+import collections
+import numpy as np
+import graph
+
+# every edge (r, h) of a compact graph, in the order of the residents'
+# preference lists, with the rank of h on r's list and of r on h's list
+RankArrays = collections.namedtuple('RankArrays', ['C', 'indexA', 'indexB', 'res', 'hos',
+                                                   'rank_r', 'rank_h', 'upper'])
+BlockingPairs = collections.namedtuple('BlockingPairs', ['count', 'pairs', 'residents'])
+# statistics for several matchings, see matching_statistics
+MatchingStatistics = collections.namedtuple('MatchingStatistics', ['matchings', 'A', 'B'])
+# K x K popularity margins of K matchings, see popularity_margins
+PopularityMargins = collections.namedtuple('PopularityMargins', ['residents', 'hospitals', 'total'])
+
+# rank of the partner of an unmatched vertex, worse than any rank
+UNMATCHED = np.iinfo(np.int64).max
+
+
+def edge_arrays(P):
+    """
+    the edges of the partition P as arrays
+    :param P: partition in a compact graph
+    :return: arrays u, v and rank of v on u's list, for every edge (u, v)
+    """
+    offsets = np.asarray(P.offsets, dtype=np.int64)
+    u = np.repeat(np.arange(len(P.names), dtype=np.int64), np.diff(offsets))
+    v = np.asarray(P.prefs, dtype=np.int64)
+    return u, v, np.arange(len(v), dtype=np.int64) - offsets[u]
+
+
+def rank_arrays(C):
+    """
+    builds the rank arrays for the compact graph C once,
+    so that statistics over all the edges can be vectorized
+    :param C: compact graph, see graph.to_compact_graph
+    :return: rank arrays for C
+    """
+    n1 = len(C.A.names)
+    res, hos, rank_r = edge_arrays(C.A)
+    hosB, resB, rankB = edge_arrays(C.B)
+
+    # find (h, r) of every edge of a resident among the edges of the hospitals
+    keysB = hosB * n1 + resB
+    order = np.argsort(keysB, kind='stable')
+    keys = hos * n1 + res
+    pos = np.minimum(np.searchsorted(keysB[order], keys), max(len(keysB) - 1, 0))
+    rank_h = np.full(len(keys), np.iinfo(np.int64).max, dtype=np.int64)
+    if len(keysB):
+        found = keysB[order][pos] == keys
+        rank_h[found] = rankB[order][pos][found]
+
+    return RankArrays(C, graph.name_index(C.A.names), graph.name_index(C.B.names), res, hos,
+                      rank_r, rank_h, np.asarray(C.B.upper, dtype=np.int64))
+
+
+def partner_array(R, M):
+    """
+    partners of the residents in M as an array of hospital ids
+    :param R: rank arrays, see rank_arrays
+    :param M: matching in the graph
+    :return: array with the id of the partner of every resident, -1 if unmatched
+    """
+    return np.fromiter((R.indexB[M[r]] if r in M else -1 for r in R.C.A.names),
+                       dtype=np.int64, count=len(R.C.A.names))
+
+
+def partner_ranks(R, partner):
+    """
+    :param R: rank arrays, see rank_arrays
+    :param partner: partner array, see partner_array
+    :return: boolean mask of the matched edges, rank of the partner on each resident's
+             list (the length of the list if unmatched), and the rank of the worst
+             partner on each hospital's list (-1 if unmatched)
+    """
+    matched = partner[R.res] == R.hos
+    rank_p = np.diff(np.asarray(R.C.A.offsets, dtype=np.int64))
+    rank_p[R.res[matched]] = R.rank_r[matched]
+    worst = np.full(len(R.C.B.names), -1, dtype=np.int64)
+    np.maximum.at(worst, R.hos[matched], R.rank_h[matched])
+    return matched, rank_p, worst
+
+
+def blocking_mask(R, partner, ranks=None):
+    """
+    finds the edges that block the matching, same as
+    matching_utils.unstable_pairs but over all the edges at once
+    :param R: rank arrays, see rank_arrays
+    :param partner: partner array, see partner_array
+    :param ranks: partner_ranks(R, partner), if already computed
+    :return: boolean mask over the edges in R
+    """
+    matched, rank_p, worst = partner_ranks(R, partner) if ranks is None else ranks
+    nmatched = np.bincount(partner[partner >= 0], minlength=len(R.C.B.names))
+    # the resident prefers the hospital to its partner
+    prefers = R.rank_r < rank_p[R.res]
+    # the hospital is under-subscribed, has no partner,
+    # or prefers the resident to its worst partner
+    h = R.hos
+    accepts = (nmatched[h] < R.upper[h]) | (nmatched[h] == 0) | (R.rank_h < worst[h])
+    return prefers & accepts
+
+
+def blocking_pairs(R, M):
+    """
+    blocking pairs of M computed from the rank arrays in one pass
+    :param R: rank arrays, see rank_arrays
+    :param M: matching in the graph
+    :return: number of blocking pairs, the list of pairs, and the set of blocking residents
+    """
+    mask = blocking_mask(R, partner_array(R, M))
+    namesA, namesB = R.C.A.names, R.C.B.names
+    pairs = [(namesA[r], namesB[h]) for r, h in zip(R.res[mask].tolist(), R.hos[mask].tolist())]
+    residents = set(namesA[r] for r in np.unique(R.res[mask]).tolist())
+    return BlockingPairs(int(mask.sum()), pairs, residents)
+
+
+def matching_statistics(R, matchings):
+    """
+    statistics for the matchings, and for every pair of them, computed
+    together from the rank arrays, a resident compares two matchings by the
+    rank of its partners, and a hospital by the rank of its worst partner,
+    being unmatched is worse than being matched
+    :param R: rank arrays, see rank_arrays
+    :param matchings: dict desc -> matching
+    :return: MatchingStatistics with
+             matchings: desc -> {'size', 'bp', 'bp_ratio', 'bp_residents', 'signature'},
+                        signature is dict rank (1 based) -> number of residents
+             A, B: (desc, other) -> {'r_1', 'r_upto_3', 'r_better', 'r_equal', 'r_worse'},
+                   the number of vertices in the partition matched to their rank-1,
+                   and upto rank-3, partner in desc, and better off, equally off,
+                   and worse off in desc than in other
+    """
+    descs = list(matchings)
+    m = len(R.res)
+    rankA = np.full((len(descs), len(R.C.A.names)), UNMATCHED, dtype=np.int64)
+    rankB = np.full((len(descs), len(R.C.B.names)), UNMATCHED, dtype=np.int64)
+
+    stats = {}
+    for i, desc in enumerate(descs):
+        partner = partner_array(R, matchings[desc])
+        ranks = partner_ranks(R, partner)
+        matched, rank_p, worst = ranks
+        mask = blocking_mask(R, partner, ranks)
+        size, bp = int(np.count_nonzero(partner >= 0)), int(mask.sum())
+        sig = np.bincount(R.rank_r[matched])
+        stats[desc] = {'size': size, 'bp': bp, 'bp_ratio': bp / (m - size),
+                       'bp_residents': int(len(np.unique(R.res[mask]))),
+                       'signature': dict((k + 1, c) for k, c in enumerate(sig.tolist()) if c)}
+        rankA[i] = np.where(partner >= 0, rank_p, UNMATCHED)
+        rankB[i] = np.where(worst >= 0, worst, UNMATCHED)
+
+    def compare(rank):
+        r_1, r_upto_3 = (rank == 0).sum(axis=1), (rank <= 2).sum(axis=1)
+        better = (rank[:, None, :] < rank[None, :, :]).sum(axis=2)
+        equal = (rank[:, None, :] == rank[None, :, :]).sum(axis=2)
+        ret = {}
+        for i, desc in enumerate(descs):
+            for j, other in enumerate(descs):
+                if i != j:
+                    ret[(desc, other)] = {'r_1': int(r_1[i]), 'r_upto_3': int(r_upto_3[i]),
+                                          'r_better': int(better[i, j]), 'r_equal': int(equal[i, j]),
+                                          'r_worse': int(better[j, i])}
+        return ret
+
+    return MatchingStatistics(stats, compare(rankA), compare(rankB))
+
+
+def popularity_margins(R, matchings):
+    """
+    margins of every pair of the matchings, the margin of M_k over M_l is the
+    number of votes for M_k less the number of votes for M_l, a resident votes
+    for the matching in which it has the better partner, and a hospital pairs
+    up the residents it has in only one of the matchings in the way most
+    favourable to M_k, see graph.pairing_vote, same as graph.compare_matchings
+    :param R: rank arrays, see rank_arrays
+    :param matchings: list of K matchings
+    :return: PopularityMargins of K x K arrays, M_l is popular among the matchings
+             if total[k, l] <= 0 for every k
+    """
+    K = len(matchings)
+    partners = [partner_array(R, M) for M in matchings]
+    rankA = np.stack([np.where(p >= 0, partner_ranks(R, p)[1], UNMATCHED) for p in partners]) \
+        if K else np.zeros((0, len(R.C.A.names)), dtype=np.int64)
+
+    # edges grouped by hospital, from the best resident to the worst
+    order = np.lexsort((R.rank_h, R.hos))
+    hos, rank_h = R.hos[order], R.rank_h[order]
+    matched = [(p[R.res] == R.hos)[order] for p in partners]
+
+    def hospital_votes(k, l):
+        # the edges in only one of the matchings, one group per hospital
+        changed = np.flatnonzero(matched[k] != matched[l])
+        total = 0
+        for group in np.split(changed, np.flatnonzero(np.diff(hos[changed])) + 1):
+            in_k, ranks = matched[k][group], rank_h[group]
+            total += graph.pairing_vote(ranks[in_k].tolist(), ranks[~in_k].tolist())
+        return total
+
+    residents = np.zeros((K, K), dtype=np.int64)
+    hospitals = np.zeros((K, K), dtype=np.int64)
+    for k in range(K):
+        for l in range(K):
+            if k != l:
+                residents[k, l] = np.sign(rankA[l] - rankA[k]).sum()
+                hospitals[k, l] = hospital_votes(k, l)
+    return PopularityMargins(residents, hospitals, residents + hospitals)
+
+
+def rank_by_popularity(margins):
+    """
+    :param margins: PopularityMargins, see popularity_margins
+    :return: indices of the matchings, ordered by the greatest margin of the
+             other matchings over them, the most popular first
+    """
+    K = len(margins.total)
+    greatest = [max((margins.total[k, l] for k in range(K) if k != l), default=0) for l in range(K)]
+    return sorted(range(K), key=lambda l: greatest[l])
@@ -1,12 +1,13 @@
+import io
 import os
 import csv
+import posixpath
 import argparse
 import graph
-import graph_parser
-import matching_algos
 import matching_utils
+import matching_binary
+import session
 import collections
-from pylatex import Document, Subsection, Tabular
 
 
 # matching descriptions
@@ -23,59 +24,6 @@ OTHER = {STABLE: [MAX_CARD_POPULAR, POP_AMONG_MAX_CARD],
          POP_AMONG_MAX_CARD: [STABLE, MAX_CARD_POPULAR]}
 
 
-def count_if(G, M1, M2, f, A=True):
-    """
-    count men on choice between M1 and M2
-    :param G: bipartite graph
-    :param M1: first matching
-    :param M2: second matching
-    :param f: predicate function
-    :param A: True if processing partition A, False otherwise
-    """
-    count = 0
-    partition = G.A if A else G.B
-    for u in partition:
-        M1_u, M2_u = M1.get(u), M2.get(u)
-        count += 1 if f(G, u, M1_u, M2_u) else 0
-    return count
-
-
-def better(G, u, M1_u, M2_u):
-    """
-    is M1_u better than M2_u
-    """
-    # M1_u is not better than M2_u
-    if M1_u is None and M2_u is None: return False
-    if M1_u is None: return False
-    # M1_u is better than M2_u
-    if M2_u is None: return True
-    return G.E[u].index(M1_u) < G.E[u].index(M2_u)
-
-
-def equal(G, u, M1_u, M2_u):
-    """
-    is M1_u equal to M2_u
-    """
-    # M1_u is equal to M2_u
-    if M1_u is None and M2_u is None: return True
-    # M1_u is not equal to M2_u
-    if M1_u is None: return False
-    if M2_u is None: return False
-    return G.E[u].index(M1_u) == G.E[u].index(M2_u)
-
-
-def worse(G, u, M1_u, M2_u):
-    """
-    is M1_u worse than M2_u
-    """
-    # M1_u is not worse than M2_u
-    if M1_u is None and M2_u is None: return False
-    if M2_u is None: return False
-    # M1_u is worse than M2_u
-    if M1_u is None: return True
-    return G.E[u].index(M1_u) > G.E[u].index(M2_u)
-
-
 def sum_ranks(sig, ranks):
     """
     number of vertices matched to one of the given ranks in the signature
@@ -84,16 +32,18 @@ def sum_ranks(sig, ranks):
     return sum([sig[rank] for rank in ranks if rank in sig])
 
 
-def signature(G, M):
+def signature(G, M, ranks=None):
     """
     signature of the matching
     :param G: bipartite graph
     :param M: a matching in G
+    :param ranks: rank index for G, see graph.rank_index
     """
+    ranks = graph.rank_index(G, G.A) if ranks is None else ranks
     sig = collections.defaultdict(int)
     for a in G.A:
         if a in M:
-            index = G.E[a].index(M[a]) + 1
+            index = ranks[a][M[a]] + 1
             sig[index] += 1
     return sig
 
@@ -133,27 +83,7 @@ def total_deficiency(G, M):
     return sum_def
 
 
-def blocking_residents(bp):
-    """
-    returns the set of blocking residents given the list
-    of blocking pairs
-    :param bp: list of blocking pairs
-    """
-    return set(a for a, _ in bp)
-
-
-def stats_for_partition(G, matchings):
-    ret = {}
-    for desc in DESC:
-        M = matchings[desc]
-        sig = signature(G, M)
-        for other in OTHER[desc]:
-            M1 = matchings[other]
-            ret[(desc, other)] = {'r_1': sum_ranks(sig, (1,)), 'r_better': count_if(G, M, M1, better)}
-    return ret
-
-
-def hr_stats(G, matchings, output_dir, stats_filename):
+def hr_stats(G, matchings, output_dir, stats_filename, S=None):
     def M_vs_M_s(M_p_size, M_p_r_1, M_p_r_pref, M_p_bp, rnum, enum, M_s_size, M_s_r_1, M_s_r_pref):
         delta = (M_p_size - M_s_size) * 100 / M_s_size
         delta_1 = (M_p_r_1 - M_s_r_1) * 100 / M_s_r_1
@@ -161,18 +91,12 @@ def hr_stats(G, matchings, output_dir, stats_filename):
         bp_m = M_p_bp * 100 / (enum - M_p_size)
         return {'delta': delta, 'delta_1': delta_1, 'delta_r': delta_r, 'bp_m': bp_m}
 
-    stats_G = {}
     m = sum(len(G.E[r]) for r in G.A)
+    S = S or session.SolveSession(G)
 
-    # common graph statistics
-    for desc in matchings:
-        M = matchings[desc]
-        msize = matching_utils.matching_size(G, M)
-        bp = matching_utils.unstable_pairs(G, M)
-        stats_G[desc] = {'size': msize, 'bp': len(bp), 'bp_ratio': len(bp)/(m - msize)}
-
-    # statistics for residents
-    stats_r = stats_for_partition(G, matchings)
+    # common graph statistics, and statistics for residents
+    st = S.matching_statistics(matchings)
+    stats_G, stats_r = st.matchings, st.A
 
     M_p_vs_M_s = M_vs_M_s(stats_G[MAX_CARD_POPULAR]['size'],
                           stats_r[(MAX_CARD_POPULAR, STABLE)]['r_1'],
@@ -196,181 +120,364 @@ def hr_stats(G, matchings, output_dir, stats_filename):
             'R': len(G.A), 'H': len(G.B), 'S_M_s': stats_G[STABLE]['size']}
 
 
-def stats_for_partition_tex(G, matchings, doc, A=True):
+# columns of the report tables, key in the statistics and heading
+GENERAL_COLUMNS = (('size', 'size'), ('bp', 'bp'), ('bp_ratio', 'bp ratio'))
+HEURISTIC_COLUMNS = GENERAL_COLUMNS + (('bp_residents', 'block-R'), ('r_1', 'rank-1'),
+                                       ('deficiency', 'deficiency'))
+PARTITION_COLUMNS = (('r_1', 'rank-1'), ('r_upto_3', 'rank-upto-3'), ('r_better', 'better'))
+
+# a table in a report, rows is a list of (description, dict key -> value)
+ReportTable = collections.namedtuple('ReportTable', ['title', 'heading', 'columns', 'rows'])
+
+
+def partition_table(stats, A=True):
+    """
+    :param stats: statistics for the matchings, see session.SolveSession.matching_statistics
+    :param A: True for the statistics for partition A, False for B
+    :return: ReportTable comparing each of the matchings in DESC with the others
+    """
+    stats_p = stats.A if A else stats.B
+    rows = [('{}/{}'.format(desc, other), stats_p[(desc, other)]) for desc in DESC for other in OTHER[desc]]
+    return ReportTable('{} statistics'.format('A' if A else 'B'), 'vs', PARTITION_COLUMNS, rows)
+
+
+def report_tables(G, matchings, S=None, heuristic=False):
+    """
+    statistics of the matchings in G, as emitted by generate_hr_tex,
+    or generate_heuristic_tex if heuristic is True
+    :param G: graph
+    :param matchings: information about the matchings
+    :param S: solve session for G, see session.SolveSession
+    :param heuristic: True for the statistics of the heuristics
+    :return: list of ReportTable
+    """
+    S = S or session.SolveSession(G)
+    st = S.matching_statistics(matchings)
+    details = ReportTable('graph details', None, None,
+                          [('n1', {'': len(G.A)}), ('n2', {'': len(G.B)}),
+                           ('m', {'': sum(len(G.E[r]) for r in G.A)})])
+    if not heuristic:
+        return [details,
+                ReportTable('general statistics', 'description', GENERAL_COLUMNS,
+                            [(desc, st.matchings[desc]) for desc in matchings]),
+                partition_table(st)]
+    rows = [(desc, dict(st.matchings[desc], r_1=sum_ranks(st.matchings[desc]['signature'], (1,)),
+                        deficiency=S.stable_deficiency()))
+            for desc in matchings]
+    return [details, ReportTable('Size statistics', 'description', HEURISTIC_COLUMNS, rows)]
+
+
+def add_tex_table(doc, t):
+    """
+    emits the table in a subsection of doc
+    :param doc: pylatex document or section
+    :param t: ReportTable
+    """
+    from pylatex import Subsection, Tabular
+    with doc.create(Subsection(t.title)):
+        columns = t.columns or (('', ''),)
+        with doc.create(Tabular('|{}|'.format('|'.join('c' * (len(columns) + 1))))) as table:
+            if t.columns:
+                table.add_hline()
+                table.add_row((t.heading,) + tuple(heading for _, heading in columns))
+            for desc, row in t.rows:
+                table.add_hline()
+                table.add_row((desc,) + tuple(row[k] for k, _ in columns))
+            table.add_hline()
+
+
+def stats_for_partition_tex(G, matchings, doc, A=True, stats=None):
     """
     print statistics for the partition specified
     :param G: graph
     :param matchings: information about the matchings
     :param doc: document to emit the stats
     :param A: True if emitting stats for partition A, False for B
+    :param stats: statistics for the matchings, see session.SolveSession.matching_statistics
     """
-    section_name = 'A' if A else 'B'
-    with doc.create(Subsection('{} statistics'.format(section_name))):
-        with doc.create(Tabular('|c|c|c|c|')) as table:
-            table.add_hline()
-            table.add_row(('vs', 'rank-1', 'rank-upto-3', 'better'))
-            for desc in DESC:
-                M = matchings[desc]
-                sig = signature(G, M)
-                for other in OTHER[desc]:
-                    M1 = matchings[other]
-                    table.add_hline()
-                    table.add_row(('{}/{}'.format(desc, other),
-                                   sum_ranks(sig, (1,)), sum_ranks(sig, (1, 2, 3)),
-                                   count_if(G, M, M1, better)))
-            table.add_hline()
+    stats = session.SolveSession(G).matching_statistics(matchings) if stats is None else stats
+    add_tex_table(doc, partition_table(stats, A))
 
 
-def generate_hr_tex(G, matchings, output_dir, stats_filename):
+def generate_hr_tex(G, matchings, output_dir, stats_filename, S=None):
     """
     print statistics for the resident proposing stable,
     max-cardinality popular, and popular amongst max-cardinality
     matchings as a tex file
     :param G: graph
     :param matchings: information about the matchings
+    :param S: solve session for G, see session.SolveSession
     """
+    from pylatex import Document
     # create a tex file with the statistics
     doc = Document('table')
-    # M_s = matching_algos.stable_matching_hospital_residents(graph.copy_graph(G))
-
-    # add details about the graph, |A|, |B|, and # of edges
-    n1, m = len(G.A), sum(len(G.E[r]) for r in G.A)
-    with doc.create(Subsection('graph details')):
-        with doc.create(Tabular('|c|c|')) as table:
-            table.add_hline()
-            table.add_row('n1', n1)
-            table.add_hline()
-            table.add_row('n2', n1)
-            table.add_hline()
-            table.add_row('m', m)
-        table.add_hline()
-
-    with doc.create(Subsection('general statistics')):
-        with doc.create(Tabular('|c|c|c|c|')) as table:
-            table.add_hline()
-            table.add_row(('description', 'size', 'bp', 'bp ratio'))
-            for desc in matchings:
-                M = matchings[desc]
-                msize = matching_utils.matching_size(G, M)
-                bp = matching_utils.unstable_pairs(G, M)
-                table.add_hline()
-                table.add_row((desc, msize, len(bp), len(bp)/(m - msize)))
-            table.add_hline()
-
-    # statistics w.r.t. set A
-    stats_for_partition_tex(G, matchings, doc)
-
-    # statistics w.r.t. set B
-    # stats_for_partition(G, matchings, doc, False)
+    for t in report_tables(G, matchings, S):
+        add_tex_table(doc, t)
 
     stats_abs_path = os.path.join(output_dir, stats_filename)
     doc.generate_pdf(filepath=stats_abs_path, clean_tex='False')
     doc.generate_tex(filepath=stats_abs_path)
 
 
-def generate_heuristic_tex(G, matchings, output_dir, stats_filename):
+def generate_heuristic_tex(G, matchings, output_dir, stats_filename, S=None):
     """
     print statistics for the hospital proposing heuristic as a tex file
     :param G: graph
     :param matchings: information about the matchings
+    :param S: solve session for G, see session.SolveSession
     """
+    from pylatex import Document
     # create a tex file with the statistics
     doc = Document('table')
-
-    # add details about the graph, |A|, |B|, and # of edges
-    n1, m = len(G.A), sum(len(G.E[r]) for r in G.A)
-    with doc.create(Subsection('graph details')):
-        with doc.create(Tabular('|c|c|')) as table:
-            table.add_hline()
-            table.add_row('n1', n1)
-            table.add_hline()
-            table.add_row('n2', n1)
-            table.add_hline()
-            table.add_row('m', m)
-        table.add_hline()
-
-    M_s = matching_algos.stable_matching_hospital_residents(graph.copy_graph(G))
-    with doc.create(Subsection('Size statistics')):
-        with doc.create(Tabular('|c|c|c|c|c|c|c|')) as table:
-            table.add_hline()
-            table.add_row(('description', 'size', 'bp', 'bp ratio', 'block-R',
-                           'rank-1', 'deficiency'))
-            for desc in matchings:
-                M = matchings[desc]
-                sig = signature(G, M)
-                bp = matching_utils.unstable_pairs(G, M)
-                msize = matching_utils.matching_size(G, M)
-                table.add_hline()
-                table.add_row((desc, msize, len(bp), len(bp)/(m - msize),
-                               len(blocking_residents(bp)),
-                               sum_ranks(sig, (1,)), #sum_ranks(sig, (1, 2, 3)),
-                               total_deficiency(G, M_s)))
-            table.add_hline()
+    for t in report_tables(G, matchings, S, heuristic=True):
+        add_tex_table(doc, t)
 
     stats_abs_path = os.path.join(output_dir, stats_filename)
     #doc.generate_pdf(filepath=stats_abs_path, clean_tex='False')
     doc.generate_tex(filepath=stats_abs_path)
 
 
-def read_matching(file_name):
-    with open(file_name, newline='', encoding='utf-8') as rdr:
-        M = {}
-        for row in csv.reader(rdr, delimiter=','):
-            # M(r) = h
-            M[row[0]] = row[1]
+def directory_reports(dirpath, heuristic=False):
+    """
+    statistics of the matchings of every graph in dirpath, recursively,
+    the matchings are read from the files next to the graphs, see hr_file_stats,
+    a graph is reported if it has the stable, max-cardinality popular and
+    popular amongst max-cardinality matchings, or if heuristic is True,
+    the hospital proposing heuristic matching
+    :param dirpath: dataset directory
+    :param heuristic: see report_tables
+    :return: generates (name of the graph relative to dirpath, list of ReportTable)
+    """
+    required = (HRLQ_HHEURISTIC,) if heuristic else DESC
+    optional = (STABLE, MAX_CARD_POPULAR, POP_AMONG_MAX_CARD, HRLQ_HHEURISTIC, HRLQ_RHEURISTIC) \
+        if heuristic else DESC
+    for root, dirs, files in os.walk(dirpath):
+        dirs.sort()
+        files = set(files)
+        for filename in sorted(files):
+            if not all(mdesc + filename in files for mdesc in required): continue
+            S = session.SolveSession.from_file(os.path.join(root, filename))
+            matchings = dict((mdesc, read_matching(os.path.join(root, mdesc + filename), S.compact))
+                             for mdesc in optional if mdesc + filename in files)
+            name = os.path.relpath(os.path.join(root, filename), dirpath).replace(os.sep, '/')
+            yield name, report_tables(S.G, matchings, S, heuristic)
+
+
+def write_markdown_report(reports, fout):
+    """
+    writes the reports as markdown tables
+    :param reports: (name, list of ReportTable), see directory_reports
+    :param fout: output file
+    """
+    for name, tables in reports:
+        print('# {}\n'.format(name), file=fout)
+        for t in tables:
+            print('## {}\n'.format(t.title), file=fout)
+            columns = t.columns or (('', ''),)
+            print('| {} |'.format(' | '.join((t.heading or '',) + tuple(h for _, h in columns))), file=fout)
+            print('|{}'.format('---|' * (len(columns) + 1)), file=fout)
+            for desc, row in t.rows:
+                print('| {} |'.format(' | '.join(str(v) for v in (desc,) + tuple(row[k] for k, _ in columns))),
+                      file=fout)
+            print(file=fout)
+
+
+def write_csv_report(reports, fout):
+    """
+    writes the reports as a single CSV table, with a line for each row of
+    each table, and the columns of all the tables
+    :param reports: (name, list of ReportTable), see directory_reports
+    :param fout: output file
+    """
+    fields = ['graph', 'table', 'description'] + list(collections.OrderedDict.fromkeys(
+        k for k, _ in HEURISTIC_COLUMNS + PARTITION_COLUMNS)) + ['value']
+    writer = csv.DictWriter(fout, fieldnames=fields, extrasaction='ignore')
+    writer.writeheader()
+    for name, tables in reports:
+        for t in tables:
+            for desc, row in t.rows:
+                values = dict(row, value=row['']) if '' in row else row
+                writer.writerow(dict(values, graph=name, table=t.title, description=desc))
+
+
+def write_tex_report(reports, file_path, pdf=False):
+    """
+    writes the reports as a single tex document, with a section for
+    each graph, and compiles it once if pdf is True
+    :param reports: (name, list of ReportTable), see directory_reports
+    :param file_path: path to the output file, without the extension
+    :param pdf: also generate the pdf
+    """
+    from pylatex import Document, Section
+    doc = Document('table')
+    for name, tables in reports:
+        with doc.create(Section(name)):
+            for t in tables:
+                add_tex_table(doc, t)
+    if pdf:
+        doc.generate_pdf(filepath=file_path, clean_tex=False)
+    doc.generate_tex(filepath=file_path)
 
-            # M(h) = {r_1, ..., r_k}
-            if row[1] in M:
-                M[row[1]].add(row[0])
-            else:
-                M[row[1]] = {row[0]}
-        return M
+
+def read_matching(file_name, G=None):
+    """
+    reads the matching in file_name, either in the csv format,
+    resident, hospital on each line, or the binary format
+    :param file_name: path to the matching file
+    :param G: graph the matching is for, needed only for the binary format,
+              see matching_binary
+    :return: matching, with M[r] = h and M[h] = {r_1, ..., r_k}
+    """
+    with open(file_name, mode='rb') as fin:
+        return parse_matching(fin.read(), G, file_name)
+
+
+def parse_matching(data, G=None, file_name='<matching>'):
+    """
+    :param data: contents of a matching file, see read_matching
+    :param G: graph the matching is for, needed only for the binary format
+    :param file_name: name of the file for the error messages
+    :return: matching, with M[r] = h and M[h] = {r_1, ..., r_k}
+    """
+    if bytes(data[:len(matching_binary.MAGIC)]) == matching_binary.MAGIC:
+        if G is None:
+            raise ValueError('{}: the graph is needed to read a binary matching'.format(file_name))
+        return matching_binary.from_buffer(data, G, file_name)
+
+    M = {}
+    for row in csv.reader(io.StringIO(str(data, 'utf-8'), newline=''), delimiter=','):
+        # M(r) = h
+        M[row[0]] = row[1]
+
+        # M(h) = {r_1, ..., r_k}
+        if row[1] in M:
+            M[row[1]].add(row[0])
+        else:
+            M[row[1]] = {row[0]}
+    return M
 
 
 def generate_file_stats(entry, req, stats):
-    G_name = entry.name
-    G_path = os.path.abspath(entry.path)
+    dirpath, file_stats = hr_file_stats(entry.path, req)
+    stats[dirpath].append(file_stats)
+
+
+def hr_file_stats(G_path, req):
+    """
+    statistics for the graph in G_path and the matchings specified in req,
+    the matchings are read from the files next to the graph
+    :param G_path: path to the graph file
+    :param req: matchings to read
+    :return: directory containing the graph, and the statistics, see hr_stats
+    """
+    G_name = os.path.basename(G_path)
+    G_path = os.path.abspath(G_path)
     dirpath = os.path.dirname(G_path)
 
+    S = session.SolveSession.from_file(G_path)
+
     # read matchings specified in req
     matchings = {}
     for mdesc in (STABLE, MAX_CARD_POPULAR, POP_AMONG_MAX_CARD):
         if mdesc in req:
             mpath = os.path.join(dirpath, '{}{}'.format(mdesc, G_name))
-            matchings[mdesc] = read_matching(mpath)
+            matchings[mdesc] = read_matching(mpath, S.compact)
 
     # generate statistics for the files
     print('processing', dirpath, G_name)
     #print(hr_stats(graph_parser.read_graph(G_path), matchings, dirpath, G_name))
-    stats[dirpath].append(hr_stats(graph_parser.read_graph(G_path), matchings, dirpath, G_name))
+    return dirpath, hr_stats(S.G, matchings, dirpath, G_name, S)
+
+
+def hr_archive_records(archive, G_name, req):
+    """
+    locates the graph G_name and the matchings specified in req in the archive,
+    the matchings are the records next to the graph, see hr_file_stats
+    :param archive: dataset_archive.DatasetArchive
+    :param G_name: name of the graph in the archive
+    :param req: matchings to read
+    :return: record of the graph, and dict description -> record of the matching,
+             None if it is missing, see DatasetArchive.locate
+    """
+    import dataset_archive
+    dirpath, filename = posixpath.split(G_name)
+    return archive.locate(dataset_archive.GRAPH, G_name), \
+        dict((mdesc, archive.locate(dataset_archive.MATCHING, posixpath.join(dirpath, mdesc + filename)))
+             for mdesc in (STABLE, MAX_CARD_POPULAR, POP_AMONG_MAX_CARD) if mdesc in req)
+
+
+def hr_archive_stats(archive_path, G_name, G_record, M_records):
+    """
+    statistics for the graph G_name in the archive and its matchings, read
+    from the records located by hr_archive_records, so that the index of the
+    archive is read once for all the graphs
+    :param archive_path: path to the dataset archive, see dataset_archive
+    :param G_name: name of the graph in the archive
+    :param G_record: offset and size of the graph, see dataset_archive.read_record
+    :param M_records: dict description -> offset and size of the matching
+    :return: directory containing the graph in the archive, and the statistics
+    """
+    import graph_binary
+    import dataset_archive
+    dirpath, filename = posixpath.split(G_name)
+    C = graph_binary.from_buffer(dataset_archive.read_record(archive_path, *G_record),
+                                 '{}:{}'.format(archive_path, G_name))
+    S = session.SolveSession(graph.from_compact_graph(C))
+    matchings = {}
+    for mdesc, record in M_records.items():
+        M_name = '{}:{}'.format(archive_path, posixpath.join(dirpath, mdesc + filename))
+        if record is None:
+            raise KeyError('{}: missing matching'.format(M_name))
+        matchings[mdesc] = parse_matching(dataset_archive.read_record(archive_path, *record), S.compact, M_name)
+    print('processing', archive_path, G_name)
+    return dirpath, hr_stats(S.G, matchings, dirpath, filename, S)
 
 
 def main():
     parser = argparse.ArgumentParser(description='''Generate statistics in latex
                                 format given a bipartite graph and matchings''')
-    parser.add_argument('-G', dest='G', help='Bipartite graph', required=True, metavar='')
+    parser.add_argument('-G', dest='G', help='Bipartite graph', metavar='')
+    parser.add_argument('-D', dest='D', help='''Dataset directory, report all the graphs in it
+                        and their matchings in a single document''', metavar='')
     parser.add_argument('-S', dest='S', help='Stable matching in the graph', metavar='')
     parser.add_argument('-P', dest='P', help='Max-cardinality popular matching in the graph', metavar='')
     parser.add_argument('-M', dest='M', help='Popular among max-cardinality matchings in the graph', metavar='')
     parser.add_argument('-H', dest='H', help='Hospital proposing HRLQ heuristic in the graph', metavar='')
     parser.add_argument('-R', dest='R', help='Resident proposing HRLQ heuristic in the graph', metavar='')
     parser.add_argument('-O', dest='O', help='Directory where the statistics should be stored', metavar='')
+    parser.add_argument('--heuristic', action='store_true', help='Report the HRLQ heuristics with -D')
+    parser.add_argument('--format', dest='format', choices=('tex', 'md', 'csv'), default='tex',
+                        help='Format of the report with -D')
+    parser.add_argument('--pdf', action='store_true', help='Compile the tex report with -D')
     args = parser.parse_args()
 
-    G, matchings = graph_parser.read_graph(args.G), {}
+    if args.D:
+        reports = directory_reports(args.D, args.heuristic)
+        report_path = os.path.join(args.O or '.', 'report')
+        if args.format == 'tex':
+            write_tex_report(reports, report_path, args.pdf)
+        else:
+            with open('{}.{}'.format(report_path, args.format), mode='w', encoding='utf-8', newline='') as fout:
+                (write_markdown_report if args.format == 'md' else write_csv_report)(reports, fout)
+        return
+    if not args.G:
+        parser.error('one of -G and -D is required')
+
+    S = session.SolveSession.from_file(args.G)
+    G, matchings = S.G, {}
     for mdesc, mfile in ((STABLE, args.S), (MAX_CARD_POPULAR, args.P),
                          (POP_AMONG_MAX_CARD, args.M), (HRLQ_HHEURISTIC, args.H),
                          (HRLQ_RHEURISTIC, args.R)):
         if mfile is not None:
-            M = read_matching(mfile)
+            M = read_matching(mfile, S.compact)
             matchings[mdesc] = M
             # if not matching_utils.is_feasible(G, M):
                 # raise Exception('{} matching is not feasible for the graph'.format(mdesc))
     # print(args.H, matchings)
     if args.H: # generate heuristic tex file
-        generate_heuristic_tex(G, matchings, args.O, os.path.basename(args.G))
+        generate_heuristic_tex(G, matchings, args.O, os.path.basename(args.G), S)
     else: # generate tex for M_s, M_p, and M_m
-        generate_hr_tex(G, matchings, args.O, os.path.basename(args.G))
+        generate_hr_tex(G, matchings, args.O, os.path.basename(args.G), S)
 
 
 if __name__ == '__main__':
@@ -1,9 +1,10 @@
 import os
+import time
 import sea
 import graph
-import graph_parser
-import matching_algos
 import matching_utils
+import session
+import stats
 
 
 def is_graph_file(entry):
@@ -18,31 +19,32 @@ def corr_matching_and_stats(entry, matching):
             os.path.join(dirpath, 'stats_{}'.format(entry.name)) )
 
 
-def blocking_residents(G, bpairs):
-    bres = set()
-    for a, b in bpairs:
-        if a in G.A: bres.add(a)
-        if b in G.A: bres.add(b)
-    return bres
-
-
 def rank_1_residents(G, M):
     return [a for a in G.A if a in M and G.E[a].index(M[a]) == 0]
 
 
-def print_matching_stats(G, M, filepath):
-    size = matching_utils.matching_size(G, M)
-    bpairs = matching_utils.unstable_pairs(G, M)
-    bres = blocking_residents(G, bpairs)
-    rank1 = rank_1_residents(G, M)
-    M_s = matching_algos.stable_matching_hospital_residents(graph.copy_graph(G))
+def matching_stats_record(G, M, S=None):
+    """
+    :param G: graph
+    :param M: matching in G
+    :param S: solve session for G, see session.SolveSession
+    :return: statistics of M, see stats.FIELDS
+    """
+    S = S or session.SolveSession(G)
+    bp = S.blocking_pairs(M)
+    return {'size': matching_utils.matching_size(G, M), 'bp': bp.count,
+            'bres': len(bp.residents), 'rank1': len(rank_1_residents(G, M)),
+            'deficiency': S.stable_deficiency()}
+
 
+def write_matching_stats(record, filepath):
     with open(filepath, mode='w', encoding='utf-8') as out:
-        print('size: {}'.format(size), file=out)
-        print('# blocking pair: {}'.format(len(bpairs)), file=out)
-        print('# blocking residents: {}'.format(len(bres)), file=out)
-        print('# residents matched to rank-1 partners: {}'.format(len(rank1)), file=out)
-        print('total deficiency: {}'.format(sea.total_deficiency(G, M_s)), file=out)
+        for k, name in stats.FIELDS:
+            print('{}: {}'.format(name, record[k]), file=out)
+
+
+def print_matching_stats(G, M, filepath, S=None):
+    write_matching_stats(matching_stats_record(G, M, S), filepath)
 
 
 def is_matched_edge(M, u, v):
@@ -61,27 +63,44 @@ def unmatched_edges(G, M):
 
 
 # does r_ has justified envy towards r
-def has_envy(G, M, r_, r, h):
+def has_envy(G, M, r_, r, h, ranks=None):
+    ranks = graph.rank_index(G, (r_, h)) if ranks is None else ranks
     # r_ is unmatched or prefers h over M[r_]
-    if ((r_ not in M or G.E[r_].index(h) < G.E[r_].index(M[r_])) and
+    if ((r_ not in M or ranks[r_][h] < ranks[r_][M[r_]]) and
         # h prefers r_ over r
-        G.E[h].index(r_) < G.E[h].index(r)):
+        ranks[h][r_] < ranks[h][r]):
             return True
     return False
 
 
-def generate_stats(dirpath):
+def generate_stats(dirpath, sink=None):
+    """
+    writes the statistics of the maximal envy-free matchings of the graphs in
+    dirpath, recursively, to the sink, or to the stats files next to the graphs
+    :param dirpath: dataset directory
+    :param sink: if given, the statistics are written to it as records with
+                 the directory, the graph, its size and the time taken,
+                 see stats.StatsSink, instead of to the stats files
+    """
     for entry in os.scandir(dirpath):
         if entry.is_file():
             if is_graph_file(entry):
                 mpath, statpath = corr_matching_and_stats(entry, sea.MAXIMAL_ENVYFREE)
                 if os.path.isfile(mpath):
-                    M = sea.read_matching(mpath)
+                    start = time.perf_counter()
+                    S = session.SolveSession.from_file(entry.path)
+                    M = sea.read_matching(mpath, S.compact)
                     if len(M) != 0:
-                        G = graph_parser.read_graph(entry.path)
-                        print_matching_stats(G, M, statpath)
+                        record = matching_stats_record(S.G, M, S)
+                        if sink is None:
+                            write_matching_stats(record, statpath)
+                        else:
+                            record.update(dir=dirpath, graph=entry.name, n1=len(S.G.A), n2=len(S.G.B),
+                                          m=sum(len(S.G.E[r]) for r in S.G.A),
+                                          elapsed=time.perf_counter() - start)
+                            sink.write(record)
         elif entry.is_dir():
-            generate_stats(entry.path)
+            generate_stats(entry.path, sink)
 
 
 if __name__ == '__main__':
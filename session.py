@@ -0,0 +1,143 @@
+import graph
+import graph_cache
+import graph_parser
+import matching_algos
+import matching_utils
+import matching_store
+
+
+class SolveSession:
+    """
+    a hospital residents instance that is read and indexed once, the
+    matchings and the statistics computed on it are cached, so that
+    computing several matchings shares the preprocessing, if a store is
+    configured the matchings are also kept in it, shared by the sessions
+    on the same instance
+    """
+    def __init__(self, G, store=None, key=None):
+        """
+        :param G: bipartite graph
+        :param store: matching store, by default the one configured in the environment,
+                      see matching_store.default_store, False to not use a store
+        :param key: key of the instance in the store, by default the hash of
+                    the instance, see matching_store.instance_hash
+        """
+        self.G = G
+        self.cache = {} if key is None else {'key': key}
+        self.store = matching_store.default_store() if store is None else store
+
+    @classmethod
+    def from_file(cls, file_path, store=None):
+        """
+        :param file_path: path to the graph file
+        :param store: see SolveSession
+        :return: session for the graph in the file, keyed in the store by the hash
+                 of the file, the one of the graph cache, see graph_cache.file_key
+        """
+        store = matching_store.default_store() if store is None else store
+        cache = graph_cache.default_cache()
+        key = graph_cache.file_key(file_path, graph_parser.VERSION) if store or cache else None
+        return cls(graph_parser.read_graph(file_path, cache=cache or False, key=key), store, key)
+
+    def cached(self, key, fn):
+        """
+        :param key: name of the result
+        :param fn: function computing the result if it is not cached
+        :return: result of fn, computed at most once per session
+        """
+        if key not in self.cache:
+            self.cache[key] = fn()
+        return self.cache[key]
+
+    @property
+    def ranks(self):
+        return self.cached('ranks', lambda: graph.rank_index(self.G))
+
+    @property
+    def compact(self):
+        return self.cached('compact', lambda: graph.to_compact_graph(self.G))
+
+    @property
+    def arrays(self):
+        import rank_arrays
+        return self.cached('arrays', lambda: rank_arrays.rank_arrays(self.compact))
+
+    @property
+    def key(self):
+        return self.cached('key', lambda: matching_store.instance_hash(self.compact))
+
+    def stored(self, algorithm, fn):
+        """
+        :param algorithm: name of the algorithm, see matching_store.ALGORITHMS
+        :param fn: function computing the matching if it is not stored
+        :return: matching computed by the algorithm
+        """
+        if not self.store:
+            return self.cached(algorithm, fn)
+        return self.cached(algorithm, lambda: self.store.matching(self.key, algorithm, self.compact, fn))
+
+    def stable_matching(self):
+        return self.stored('stable', lambda: matching_algos.stable_matching_hospital_residents(
+            self.G, self.ranks))
+
+    def popular_matching(self):
+        return self.stored('popular', lambda: matching_algos.popular_matching_hospital_residents(
+            self.G, self.ranks))
+
+    def max_card_matching(self):
+        return self.stored('max_card', lambda: matching_algos.max_card_hospital_residents(self.G))
+
+    def max_card_size(self):
+        return self.cached('max_card_size', lambda: matching_utils.matching_size(
+            self.G, self.max_card_matching()))
+
+    def unstable_pairs(self, M):
+        return matching_utils.unstable_pairs(self.G, M, self.ranks)
+
+    def blocking_pairs(self, M):
+        """
+        see rank_arrays.blocking_pairs
+        """
+        import rank_arrays
+        return rank_arrays.blocking_pairs(self.arrays, M)
+
+    def envy_pairs(self, M, count_only=False):
+        return matching_utils.envy_pairs(self.G, M, self.ranks, count_only)
+
+    def exchange_blocking_pairs(self, M, count_only=False):
+        return matching_utils.exchange_blocking_pairs(self.G, M, self.ranks, count_only)
+
+    def matching_statistics(self, matchings):
+        """
+        see rank_arrays.matching_statistics
+        """
+        import rank_arrays
+        return rank_arrays.matching_statistics(self.arrays, matchings)
+
+    def popularity_margins(self, matchings):
+        """
+        see rank_arrays.popularity_margins
+        """
+        import rank_arrays
+        return rank_arrays.popularity_margins(self.arrays, matchings)
+
+    def unpopularity(self, M):
+        """
+        see popularity.unpopularity
+        """
+        import popularity
+        return popularity.unpopularity(self.G, M, self.ranks)
+
+    def is_max_card_matching(self, M):
+        return matching_utils.matching_size(self.G, M) == self.max_card_size()
+
+    def stable_deficiency(self):
+        """
+        total deficiency of the lower quota hospitals in the stable matching
+        """
+        def deficiency():
+            M = self.stable_matching()
+            return sum(max(graph.lower_quota(self.G, h) -
+                           len(matching_utils.partners_iterable(self.G, M, h)), 0)
+                       for h in self.G.B)
+        return self.cached('stable_deficiency', deficiency)
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import time
+import argparse
+import subprocess
+
+# the modules run as short lived command line tools
+CLI_MODULES = ('graph', 'graph_parser', 'graph_binary', 'matching_algos', 'matching_binary',
+               'mi_to_gr', 'popularity', 'sea', 'sea2', 'jea_exp', 'generate_instance', 'matching_stats')
+
+# these take most of the startup time, and are imported only where they are used
+HEAVY_MODULES = ('networkx', 'pylatex', 'tabulate', 'numpy', 'ply')
+
+
+def heavy_imports(module):
+    """
+    imports module in a new interpreter
+    :param module: name of the module
+    :return: the heavy modules imported along with it
+    """
+    code = 'import sys, {}; print(" ".join(m for m in {!r} if m in sys.modules))'.format(
+        module, HEAVY_MODULES)
+    out = subprocess.run([sys.executable, '-c', code], check=True, capture_output=True,
+                         text=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+    return out.stdout.split()
+
+
+def startup_time(module, repeat=5):
+    """
+    :param module: name of the module
+    :param repeat: number of runs
+    :return: least time taken to start an interpreter and import module, in seconds
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, '-c', 'import {}'.format(module)], check=True,
+                       cwd=os.path.dirname(os.path.abspath(__file__)))
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='startup time of the command line tools')
+    parser.add_argument('-n', dest='repeat', type=int, default=5, help='runs per module', metavar='')
+    parser.add_argument('--max', dest='max_time', type=float, default=None,
+                        help='fail if a module takes longer than this many seconds', metavar='')
+    args = parser.parse_args()
+
+    baseline = startup_time('sys', args.repeat)
+    print('{:<20} {:>10} {}'.format('module', 'time (ms)', 'heavy imports'))
+    print('{:<20} {:>10.1f}'.format('(interpreter)', baseline * 1000))
+    failed = False
+    for module in CLI_MODULES:
+        t, heavy = startup_time(module, args.repeat), heavy_imports(module)
+        print('{:<20} {:>10.1f} {}'.format(module, t * 1000, ' '.join(heavy)))
+        failed |= bool(heavy) or (args.max_time is not None and t > args.max_time)
+    sys.exit(1 if failed else 0)
+
+if __name__ == '__main__':
+    main()
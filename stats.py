@@ -2,6 +2,10 @@
 # -*- coding: utf-8 -*-
 
 import os
+import json
+import math
+import random
+import collections
 
 
 SIZE = 'size'
@@ -10,34 +14,152 @@ BRES = '# blocking residents'
 RANK1RES = '# residents matched to rank-1 partners'
 DEF = 'total deficiency'
 
+# fields of a matching statistics record, see sea2.matching_stats_record,
+# with their names in the text and CSV files
+FIELDS = (('size', SIZE), ('bp', BPAIRS), ('bres', BRES), ('rank1', RANK1RES), ('deficiency', DEF))
 
-def parse_stats(s):
-    return {stat.split(':')[0]: stat.split(':')[1] for stat in s.split('\n') if stat}
 
+class StatsSink:
+    """
+    appends statistics records, dicts of numbers and strings, to a file with
+    one JSON object per line, each record is written as soon as it is produced
+    """
+    def __init__(self, file_path, mode='a'):
+        """
+        :param file_path: path to the records file
+        :param mode: 'a' to append to the records in the file, 'w' to replace them
+        """
+        self.fout = open(file_path, mode=mode, encoding='utf-8')
 
-def print_stats(filepath, filename, fout):
-    with open(filepath, mode='r', encoding='utf-8') as fin:
-        filestat = parse_stats(fin.read())
-        print(','.join([filename[6:], filestat[SIZE], filestat[BPAIRS],
-                       filestat[BRES], filestat[RANK1RES], filestat[DEF]]), file=fout)
+    def __enter__(self):
+        return self
 
+    def __exit__(self, *exc):
+        self.close()
 
-def recurse_dir(dirpath, fout):
-    for entry in os.scandir(dirpath):
-        if entry.is_file() and entry.name.startswith('stats_'):
-            print_stats(entry.path, entry.name, fout)
-        elif entry.is_dir():
-            print(',{},{},{},{},{}'.format(SIZE, BPAIRS, BRES, RANK1RES, DEF), file=fout)
-            print('{},,,,'.format(entry.name), file=fout)
-            recurse_dir(entry.path, fout)
-            print('\n\n', file=fout)
+    def write(self, record):
+        print(json.dumps(record), file=self.fout, flush=True)
+
+    def close(self):
+        self.fout.close()
+
+
+def read_records(file_path):
+    """
+    :param file_path: path to a records file, see StatsSink
+    :return: generates the records in the file
+    """
+    with open(file_path, mode='r', encoding='utf-8') as fin:
+        for line in fin:
+            if line.strip():
+                yield json.loads(line)
+
+
+def flatten(record, prefix=''):
+    """
+    :param record: statistics record, possibly with nested dicts
+    :return: dict with the keys of the nested dicts joined by '.', such as 'M_p_vs_M_s.delta'
+    """
+    ret = {}
+    for k, v in record.items():
+        if isinstance(v, dict):
+            ret.update(flatten(v, '{}{}.'.format(prefix, k)))
+        else:
+            ret[prefix + k] = v
+    return ret
+
+
+class RunningStats:
+    """
+    mean and variance of a stream of numbers, updated one number at a time,
+    and their quantiles, estimated from a uniform sample of at most
+    sample_size numbers, which are exact for the shorter streams
+    """
+    def __init__(self, sample_size=1024, seed=0):
+        self.n, self.mean, self.m2 = 0, 0.0, 0.0
+        self.min, self.max = math.inf, -math.inf
+        self.sample, self.sample_size = [], sample_size
+        self.random = random.Random(seed)
+
+    def add(self, x):
+        self.n += 1
+        delta = x - self.mean
+        self.mean += delta / self.n
+        self.m2 += delta * (x - self.mean)
+        self.min, self.max = min(self.min, x), max(self.max, x)
+        # reservoir sampling
+        if len(self.sample) < self.sample_size:
+            self.sample.append(x)
+        else:
+            i = self.random.randrange(self.n)
+            if i < self.sample_size: self.sample[i] = x
+
+    @property
+    def variance(self):
+        return self.m2 / (self.n - 1) if self.n > 1 else 0.0
+
+    @property
+    def std(self):
+        return math.sqrt(self.variance)
+
+    def quantile(self, q):
+        """
+        :param q: 0 <= q <= 1
+        :return: q-th quantile, interpolated between the closest ranks
+        """
+        if not self.sample: return math.nan
+        sample = sorted(self.sample)
+        pos = q * (len(sample) - 1)
+        lo = int(pos)
+        hi = min(lo + 1, len(sample) - 1)
+        return sample[lo] + (sample[hi] - sample[lo]) * (pos - lo)
+
+    def summary(self):
+        return {'n': self.n, 'mean': self.mean, 'std': self.std, 'min': self.min,
+                'q1': self.quantile(0.25), 'median': self.quantile(0.5), 'q3': self.quantile(0.75),
+                'max': self.max}
+
+
+def aggregate(records, group_fn, fields=None):
+    """
+    statistics of the numeric fields of the records in each group, computed
+    in one pass without keeping the records
+    :param records: statistics records
+    :param group_fn: function taking a record, and returning its group
+    :param fields: names of the fields, see flatten, None for all the numeric fields
+    :return: dict group -> field -> RunningStats, in the order the groups were seen
+    """
+    groups = collections.OrderedDict()
+    for record in records:
+        group = groups.setdefault(group_fn(record), collections.defaultdict(RunningStats))
+        for k, v in flatten(record).items():
+            if (fields is None or k in fields) and isinstance(v, (int, float)) and not isinstance(v, bool):
+                group[k].add(v)
+    return groups
+
+
+def write_csv(records, fout):
+    """
+    writes the matching statistics records as CSV, with a table for each directory
+    :param records: records with the fields 'dir', 'graph' and FIELDS
+    :param fout: output file
+    """
+    dirpath = None
+    for record in records:
+        if record['dir'] != dirpath:
+            if dirpath is not None: print('\n\n', file=fout)
+            dirpath = record['dir']
+            print(',' + ','.join(name for _, name in FIELDS), file=fout)
+            print('{},,,,'.format(os.path.basename(dirpath)), file=fout)
+        print(','.join([record['graph']] + [str(record[k]) for k, _ in FIELDS]), file=fout)
+    if dirpath is not None: print('\n\n', file=fout)
 
 
 if __name__ == '__main__':
     TOPLEVELDIR = '/mnt/f55c6248-0895-4d46-8d0e-1db681847773/meghana/sea/popular/HRLQ'
     for dataset in ('shuffle', 'master', 'random'):
-        dirpath = os.path.join(TOPLEVELDIR, dataset)
+        records = os.path.join(TOPLEVELDIR, 'stats_{}.jsonl'.format(dataset))
         outfile = os.path.join(TOPLEVELDIR, '{}-stats.csv'.format(dataset))
-    
+
         with open(outfile, mode='w', encoding='utf-8') as fout:
-            recurse_dir(dirpath, fout)
+            write_csv(read_records(records), fout)
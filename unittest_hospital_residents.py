@@ -0,0 +1,597 @@
+import copy
+import os
+import random
+import io
+import operator
+import time
+import tempfile
+import unittest
+import dataset_archive
+import generate_instance
+import graph
+import graph_binary
+import graph_cache
+import graph_parser
+import incremental
+import jea_exp
+import matching_algos
+import matching_binary
+import matching_store
+import matching_utils
+import mi_to_gr
+import popularity
+import rank_arrays
+import sea
+import session
+import stats
+import startup_benchmark
+
+
+def make_graph(plistA, plistB, capacities):
+    A = set(x[0] for x in plistA)
+    B = set(x[0] for x in plistB)
+    caps = dict((a, (0, 1)) for a in A)
+    caps.update(dict((b, capacities.get(b, (0, 1))) for b in B))
+    return graph.make_graph(A, B, plistA, plistB, caps)
+
+
+def example_graph():
+    """
+    I = {r1 : h1, h2 ; r2 : h1, h2 ; r3 : h1 ; r4 : h2, h1 ;
+         h1 (2) : r3, r1, r4, r2 ; h2 (1, 2) : r2, r4, r1 ; }
+    """
+    return make_graph(
+            [('r1', ['h1', 'h2']), ('r2', ['h1', 'h2']), ('r3', ['h1']), ('r4', ['h2', 'h1'])],
+            [('h1', ['r3', 'r1', 'r4', 'r2']), ('h2', ['r2', 'r4', 'r1'])],
+            {'h1': (0, 2), 'h2': (1, 2)})
+
+
+def example_unstable_matching():
+    """
+    a feasible matching in example_graph, blocked by (r1, h1), (r3, h1) and (r4, h2)
+    """
+    return {'r1': 'h2', 'r2': 'h1', 'r4': 'h1', 'h1': {'r2', 'r4'}, 'h2': {'r1'}}
+
+
+def count_residents(G, M1, M2, compare):
+    """
+    oracle for the r_better, r_equal and r_worse statistics, the number of
+    residents r for which compare(rank of M1(r), rank of M2(r)) is True,
+    being unmatched is worse than any rank
+    """
+    ranks = graph.rank_index(G)
+    rank = lambda r, M: ranks[r][M[r]] if r in M else float('inf')
+    return sum(1 for r in G.A if compare(rank(r, M1), rank(r, M2)))
+
+
+def slow_inverse(x):
+    time.sleep(x)
+    return 1 / x
+
+
+def exit_if_negative(x):
+    if x < 0: os._exit(1)  # kills the worker process
+    time.sleep(x)
+    return x
+
+
+class TestCompactGraph(unittest.TestCase):
+    def test_round_trip(self):
+        G = example_graph()
+        C = graph.to_compact_graph(G)
+        self.assertEqual(G, graph.from_compact_graph(C))
+
+    def test_ids(self):
+        C = graph.to_compact_graph(example_graph())
+        indexA = graph.name_index(C.A.names)
+        h1 = graph.name_index(C.B.names)['h1']
+        self.assertEqual(list(graph.preference_list(C.B, h1)),
+                         [indexA[r] for r in ('r3', 'r1', 'r4', 'r2')])
+        self.assertEqual((C.B.lower[h1], C.B.upper[h1]), (0, 2))
+
+
+class TestGenerateInstance(unittest.TestCase):
+    def test_random_model(self):
+        for k in (2, 6):  # lists drawn with replacement, and by random keys
+            G = generate_instance.random_model_generator(40, 6, k, 3, seed=1)
+            self.assertEqual(len(G.A), 40)
+            for r in G.A:
+                self.assertEqual(len(set(G.E[r])), min(k, 6))
+                self.assertTrue(all(r in G.E[h] for h in G.E[r]))
+            self.assertEqual(sum(len(G.E[h]) for h in G.B), 40 * min(k, 6))
+            self.assertTrue(all(G.capacities[h] == (0, 3) for h in G.B))
+            C = generate_instance.random_model_generator(40, 6, k, 3, compact=True, seed=1)
+            self.assertEqual(graph.to_compact_graph(G), C)
+
+
+class TestGraphParser(unittest.TestCase):
+    def read_graph(self, text, compact=False):
+        with tempfile.NamedTemporaryFile('w', suffix='.txt', delete=False) as fout:
+            fout.write(text)
+        try:
+            return graph_parser.read_graph(fout.name, compact)
+        finally:
+            os.remove(fout.name)
+
+    def test_round_trip(self):
+        G = example_graph()
+        self.assertEqual(self.read_graph(graph.graph_to_UTF8_string(G)), G)
+        self.assertEqual(self.read_graph(graph.graph_to_UTF8_string(G), compact=True),
+                         graph.to_compact_graph(G))
+
+    def test_sections_in_any_order(self):
+        G = self.read_graph("""
+            @PreferenceListsB
+            h1 : r1, # comment
+                 r2 ;
+            @End
+            @PartitionB h1 (1, 2) ; @End
+            @PreferenceListsA r1 : h1 ; r2 : h1 ; @End
+            @PartitionA r1, r2 ; @End
+            """)
+        self.assertEqual(G, make_graph([('r1', ['h1']), ('r2', ['h1'])],
+                                       [('h1', ['r1', 'r2'])], {'h1': (1, 2)}))
+
+    def test_errors(self):
+        with self.assertRaisesRegex(graph_parser.GraphSyntaxError, 'line 3: invalid vertex'):
+            self.read_graph('@PartitionA\nr1,\nr2 (1 ;\n@End\n')
+        with self.assertRaisesRegex(graph_parser.GraphSyntaxError, 'line 2: expected \';\''):
+            self.read_graph('@PartitionA\nr1, r2\n@End\n')
+        with self.assertRaisesRegex(graph_parser.GraphSyntaxError, 'missing section'):
+            self.read_graph('@PartitionA\nr1 ;\n@End\n')
+
+    def test_compressed(self):
+        G = example_graph()
+        with tempfile.TemporaryDirectory() as dirpath:
+            for ext in ('.txt', '.gz', '.xz'):
+                file_path = os.path.join(dirpath, 'graph' + ext)
+                graph.write_graph_file(G, file_path)
+                self.assertEqual(graph_parser.read_graph(file_path), G)
+
+    def test_matchu_format(self):
+        text = '2\n1\n0\n0\n0\n0\n0\n0\n0\n\n1 1 1\n2 1\n\n1 2 2 1\n'
+        G = mi_to_gr.read_graph(io.StringIO(text))
+        self.assertEqual(G, make_graph([('r1', ['h1']), ('r2', ['h1'])],
+                                       [('h1', ['r2', 'r1'])], {'h1': (0, 2)}))
+        self.assertEqual(mi_to_gr.read_graph(io.StringIO(text), compact=True),
+                         graph.to_compact_graph(G))
+
+
+class TestBinaryGraph(unittest.TestCase):
+    def test_round_trip(self):
+        G = example_graph()
+        with tempfile.TemporaryDirectory() as dirpath:
+            file_path = os.path.join(dirpath, 'graph.bin')
+            graph_binary.write_binary_graph(G, file_path)
+            C = graph_binary.read_binary_graph(file_path)
+            self.assertIsInstance(C.A.prefs, memoryview)
+            self.assertEqual(graph.from_compact_graph(C), G)
+            self.assertEqual(graph_parser.read_graph(file_path), G)
+            self.assertEqual(tuple(rank_arrays.blocking_pairs(rank_arrays.rank_arrays(C),
+                                                              matching_algos.stable_matching_hospital_residents(G))),
+                             (0, [], set()))
+
+
+class TestGraphCache(unittest.TestCase):
+    def test_cached(self):
+        G = example_graph()
+        with tempfile.TemporaryDirectory() as dirpath:
+            file_path = os.path.join(dirpath, 'graph.txt')
+            graph.write_graph_file(G, file_path)
+            cache = graph_cache.GraphCache(os.path.join(dirpath, 'cache'))
+            key = cache.key(file_path, graph_parser.VERSION)
+            self.assertIsNone(cache.get(key))
+            self.assertEqual(graph_parser.read_graph(file_path, cache=cache), G)
+            self.assertEqual(graph_parser.read_graph(file_path, cache=cache), G)
+            self.assertEqual(graph_parser.read_graph(file_path, compact=True, cache=cache),
+                             graph.to_compact_graph(G))
+            self.assertIsNotNone(cache.get(key))
+
+    def test_eviction(self):
+        G = example_graph()
+        with tempfile.TemporaryDirectory() as dirpath:
+            cache = graph_cache.GraphCache(dirpath, max_size=0)
+            cache.put('g', graph.to_compact_graph(G))
+            self.assertIsNone(cache.get('g'))
+
+
+class TestBinaryMatching(unittest.TestCase):
+    def test_round_trip(self):
+        G = example_graph()
+        M = example_unstable_matching()
+        with tempfile.TemporaryDirectory() as dirpath:
+            file_path = os.path.join(dirpath, 'M')
+            matching_binary.write_matching(G, M, file_path)
+            self.assertEqual(matching_binary.read_matching(file_path, G), M)
+            self.assertEqual(sea.read_matching(file_path, graph.to_compact_graph(G)), M)
+            C = graph.to_compact_graph(G)
+            partner, rank = matching_binary.read_matching_arrays(file_path, C)
+            self.assertEqual([C.B.names[h] if h >= 0 else None for h in partner.tolist()],
+                             [M.get(r) for r in C.A.names])
+            self.assertEqual(rank.tolist(), [1, 0, -1, 1])
+
+    def test_other_graph(self):
+        G = example_graph()
+        with tempfile.TemporaryDirectory() as dirpath:
+            file_path = os.path.join(dirpath, 'M')
+            matching_binary.write_matching(G, {}, file_path)
+            G.A.add('r5')
+            G.capacities['r5'] = (0, 1)
+            with self.assertRaisesRegex(ValueError, 'not for this graph'):
+                matching_binary.read_matching(file_path, G)
+
+
+class TestMatchingStore(unittest.TestCase):
+    def test_shared_matchings(self):
+        G = example_graph()
+        with tempfile.TemporaryDirectory() as dirpath:
+            store = matching_store.MatchingStore(dirpath)
+            M = session.SolveSession(G, store).stable_matching()
+            self.assertEqual(M, matching_algos.stable_matching_hospital_residents(G))
+            session.SolveSession(copy.deepcopy(G), store).stable_matching()
+            self.assertEqual((store.hits, store.misses), (1, 1))
+
+            # a new process reads the matching from disk
+            store = matching_store.MatchingStore(dirpath)
+            self.assertEqual(session.SolveSession(G, store).stable_matching(), M)
+            self.assertEqual((store.hits, store.misses), (1, 0))
+            session.SolveSession(G, store).popular_matching()
+            self.assertEqual((store.hits, store.misses), (1, 1))
+
+    def test_from_file(self):
+        G = example_graph()
+        with tempfile.TemporaryDirectory() as dirpath:
+            file_path = os.path.join(dirpath, 'graph.txt')
+            graph.write_graph_file(G, file_path)
+            store = matching_store.MatchingStore(os.path.join(dirpath, 'store'))
+            S = session.SolveSession.from_file(file_path, store)
+            self.assertEqual(S.stable_matching(), matching_algos.stable_matching_hospital_residents(G))
+            self.assertEqual(S.key, graph_cache.file_key(file_path, graph_parser.VERSION))
+            session.SolveSession.from_file(file_path, store).stable_matching()
+            self.assertEqual((store.hits, store.misses), (1, 1))
+
+    def test_no_store(self):
+        S = session.SolveSession(example_graph(), store=False)
+        S.stable_matching()
+        self.assertNotIn('key', S.cache)
+        self.assertNotIn('compact', S.cache)
+
+    def test_memory_bound(self):
+        G = example_graph()
+        C, M = graph.to_compact_graph(G), matching_algos.stable_matching_hospital_residents(G)
+        store = matching_store.MatchingStore(max_vertices=len(M) + 1)
+        store.put('a', 'stable', C, M)
+        store.put('b', 'stable', C, M)
+        self.assertIsNone(store.get('a', 'stable', C))
+        self.assertEqual(store.get('b', 'stable', C), M)
+        self.assertEqual(store.vertices, len(M))
+
+
+class TestDatasetArchive(unittest.TestCase):
+    def test_append_and_lookup(self):
+        G = example_graph()
+        M = matching_algos.stable_matching_hospital_residents(G)
+        with tempfile.TemporaryDirectory() as dirpath:
+            file_path = os.path.join(dirpath, 'dataset.hra')
+            with dataset_archive.DatasetArchive(file_path, mode='a') as archive:
+                archive.add_graph('a/g.txt', G)
+                archive.add_matching('a/S_g.txt', G, M)
+            with dataset_archive.DatasetArchive(file_path, mode='a') as archive:
+                archive.add(dataset_archive.MATCHING, 'a/P_g.txt', b'r1,h1\nr3,h1\n')
+                archive.add_stats('a/stats_g.txt', 'size: 4\n')
+            with dataset_archive.DatasetArchive(file_path) as archive:
+                self.assertEqual(archive.names(dataset_archive.GRAPH), ['a/g.txt'])
+                self.assertEqual(archive.graph('a/g.txt'), G)
+                self.assertEqual(archive.matching('a/S_g.txt', G), M)
+                self.assertEqual(archive.matching('a/P_g.txt'),
+                                 {'r1': 'h1', 'r3': 'h1', 'h1': {'r1', 'r3'}})
+                self.assertEqual(archive.stats('a/stats_g.txt'), 'size: 4\n')
+                record = archive.locate(dataset_archive.MATCHING, 'a/P_g.txt')
+                self.assertEqual(bytes(dataset_archive.read_record(file_path, *record)), b'r1,h1\nr3,h1\n')
+                self.assertIsNone(archive.locate(dataset_archive.MATCHING, 'a/M_g.txt'))
+
+    def test_missing_index(self):
+        with tempfile.TemporaryDirectory() as dirpath:
+            file_path = os.path.join(dirpath, 'dataset.hra')
+            with dataset_archive.DatasetArchive(file_path, mode='a') as archive:
+                archive.add_graph('g.txt', example_graph())
+                archive.add_stats('stats_g.txt', 'size: 4\n')
+            with open(file_path, mode='r+b') as f:
+                f.truncate(os.path.getsize(file_path) - 1)
+            with dataset_archive.DatasetArchive(file_path) as archive:
+                self.assertEqual(len(archive), 2)
+                self.assertEqual(archive.graph('g.txt'), example_graph())
+
+
+class TestRankIndex(unittest.TestCase):
+    def test_ranks(self):
+        G = example_graph()
+        ranks = graph.rank_index(G)
+        for u in G.E:
+            self.assertEqual([ranks[u][v] for v in G.E[u]], list(range(len(G.E[u]))))
+
+    def test_unstable_pairs(self):
+        G = example_graph()
+        M = example_unstable_matching()
+        ranks = graph.rank_index(G)
+        self.assertEqual(matching_utils.unstable_pairs(G, M, ranks),
+                         matching_utils.unstable_pairs(G, M))
+        self.assertEqual(sorted(matching_utils.unstable_pairs(G, M)),
+                         [('r1', 'h1'), ('r3', 'h1'), ('r4', 'h2')])
+
+    def test_blocking_pairs_vectorized(self):
+        G = example_graph()
+        M = example_unstable_matching()
+        R = rank_arrays.rank_arrays(graph.to_compact_graph(G))
+        bp = rank_arrays.blocking_pairs(R, M)
+        self.assertEqual(bp.count, 3)
+        self.assertEqual(sorted(bp.pairs), sorted(matching_utils.unstable_pairs(G, M)))
+        self.assertEqual(bp.residents, {'r1', 'r3', 'r4'})
+
+    def test_envy_pairs(self):
+        G = example_graph()
+        M = example_unstable_matching()
+        self.assertEqual(sorted(matching_utils.envy_pairs(G, M)),
+                         [('r1', 'r2'), ('r1', 'r4'), ('r4', 'r1')])
+        self.assertEqual(matching_utils.envy_pairs(G, M, count_only=True), 3)
+
+    def test_exchange_blocking_pairs(self):
+        G = example_graph()
+        M = example_unstable_matching()
+        self.assertEqual(sorted(matching_utils.exchange_blocking_pairs(G, M)),
+                         [('r1', 'r4'), ('r4', 'r1')])
+        self.assertEqual(matching_utils.exchange_blocking_pairs(G, M, count_only=True), 2)
+
+
+class TestStableMatching(unittest.TestCase):
+    def test_resident_optimal(self):
+        G = example_graph()
+        E = copy.deepcopy(G.E)
+        M = matching_algos.stable_matching_hospital_residents(G)
+        self.assertEqual(M, {'r1': 'h1', 'r3': 'h1', 'r2': 'h2', 'r4': 'h2',
+                             'h1': {'r1', 'r3'}, 'h2': {'r2', 'r4'}})
+        self.assertEqual(matching_utils.unstable_pairs(G, M), [])
+        self.assertEqual(G.E, E)  # G is not modified
+
+
+class TestPopularMatching(unittest.TestCase):
+    def test_augmented_view(self):
+        G = example_graph()
+        G_ = matching_utils.augment_graph(G)
+        M = matching_utils.to_standard_format(
+                matching_algos.stable_matching_hospital_residents(G_))
+        self.assertEqual(matching_algos.popular_matching_hospital_residents(G), M)
+
+
+def feasible_matchings(G):
+    """
+    all the feasible matchings in a small graph G
+    """
+    A = sorted(G.A)
+    def extend(i, M):
+        if i == len(A):
+            N = dict(M)
+            for r, h in M.items():
+                N.setdefault(h, set()).add(r)
+            if all(len(N.get(h, ())) >= graph.lower_quota(G, h) for h in G.B):
+                yield N
+            return
+        yield from extend(i + 1, M)
+        for h in G.E[A[i]]:
+            if sum(h == h_ for h_ in M.values()) < graph.upper_quota(G, h):
+                M[A[i]] = h
+                yield from extend(i + 1, M)
+                del M[A[i]]
+    return list(extend(0, {}))
+
+
+class TestPopularity(unittest.TestCase):
+    def test_popular(self):
+        G = example_graph()
+        S = session.SolveSession(G)
+        self.assertIsNone(S.unpopularity(S.popular_matching()))
+        self.assertTrue(popularity.is_popular(G, S.stable_matching()))
+
+    def test_unpopular(self):
+        G = example_graph()
+        for M in ({'r4': 'h2', 'h2': {'r4'}},
+                  example_unstable_matching()):
+            U = popularity.unpopularity(G, M)
+            self.assertIsNotNone(U)
+            self.assertTrue(matching_utils.is_feasible(G, U.matching))
+            self.assertGreater(U.margin, 0)
+            self.assertEqual(U.margin, popularity.margin(G, U.matching, M))
+
+    def test_lower_quota(self):
+        # r1 cannot leave h1 for h0, h1 would be below its lower quota
+        G = make_graph([('r0', ['h0']), ('r1', ['h0', 'h1'])], [('h0', ['r0', 'r1']), ('h1', ['r1'])],
+                       {'h0': (0, 3), 'h1': (1, 2)})
+        self.assertIsNone(popularity.unpopularity(G, {'r0': 'h0', 'r1': 'h1', 'h0': {'r0'}, 'h1': {'r1'}}))
+
+    def test_brute_force(self):
+        rnd = random.Random(3)
+        for _ in range(40):
+            A, B = ['r{}'.format(i) for i in range(rnd.randint(2, 5))], ['h{}'.format(i) for i in range(3)]
+            plistA = [(r, rnd.sample(B, rnd.randint(1, 3))) for r in A]
+            plistB = [(h, rnd.sample([r for r, l in plistA if h in l], sum(h in l for _, l in plistA)))
+                      for h in B]
+            capacities = dict((h, (rnd.randint(0, 1), rnd.randint(1, 2))) for h in B)
+            G = make_graph(plistA, plistB, capacities)
+            ranks, Ms = graph.rank_index(G), feasible_matchings(G)
+            for M in Ms:
+                U = popularity.unpopularity(G, M, ranks)
+                popular = all(popularity.margin(G, N, M, ranks) <= 0 for N in Ms)
+                self.assertEqual(U is None, popular)
+                if U is not None:
+                    self.assertTrue(matching_utils.is_feasible(G, U.matching))
+                    self.assertGreater(U.margin, 0)
+
+
+class TestMaxCardMatching(unittest.TestCase):
+    def test_backends(self):
+        G = example_graph()
+        M = matching_algos.max_card_hospital_residents(G)
+        M_nx = matching_algos.max_card_hospital_residents(G, backend='networkx')
+        self.assertEqual(matching_utils.matching_size(G, M), 4)
+        self.assertEqual(matching_utils.matching_size(G, M_nx), 4)
+        self.assertTrue(matching_utils.is_feasible(G, M))
+
+
+class TestIncrementalStableMatching(unittest.TestCase):
+    def test_add_resident(self):
+        G = example_graph()
+        M = matching_algos.stable_matching_hospital_residents(G)
+        M, changed = incremental.add_resident(G, M, 'r5', ['h1', 'h2'], {'h1': 0})
+        self.assertEqual(M, matching_algos.stable_matching_hospital_residents(G))
+        self.assertEqual(changed, {'r5': (None, 'h1'), 'r1': ('h1', None)})
+
+    def test_remove_resident(self):
+        G = example_graph()
+        M = matching_algos.stable_matching_hospital_residents(G)
+        M, changed = incremental.remove_resident(G, M, 'r3')
+        self.assertEqual(M, matching_algos.stable_matching_hospital_residents(G))
+        self.assertEqual(changed, {'r3': ('h1', None), 'r2': ('h2', 'h1')})
+
+    def test_residents_touched(self):
+        class TouchedMatching(dict):  # records the vertices assigned or unassigned
+            def __init__(self, M):
+                dict.__init__(self, M)
+                self.touched = set()
+
+            def __setitem__(self, u, v):
+                self.touched.add(u)
+                dict.__setitem__(self, u, v)
+
+            def pop(self, u, *default):
+                self.touched.add(u)
+                return dict.pop(self, u, *default)
+
+        for seed in range(3):
+            G = generate_instance.random_model_generator(2000, 40, 5, 50, seed=seed)
+            M = TouchedMatching(matching_algos.stable_matching_hospital_residents(G))
+            M, changed = incremental.remove_resident(G, M, 'r1')
+            self.assertEqual(M, matching_algos.stable_matching_hospital_residents(G))
+            self.assertEqual(M.touched & G.A, set(changed) - {'r1'})
+            self.assertLess(len(changed), 40)
+
+
+class TestSolveSession(unittest.TestCase):
+    def test_shared_results(self):
+        G = example_graph()
+        S = session.SolveSession(G)
+        self.assertEqual(S.stable_matching(), matching_algos.stable_matching_hospital_residents(G))
+        self.assertEqual(S.popular_matching(), matching_algos.popular_matching_hospital_residents(G))
+        self.assertIs(S.stable_matching(), S.stable_matching())
+        self.assertTrue(S.is_max_card_matching(S.max_card_matching()))
+        self.assertEqual(S.stable_deficiency(), 0)
+
+    def test_matching_statistics(self):
+        G = example_graph()
+        S = session.SolveSession(G)
+        matchings = {sea.STABLE: S.stable_matching(), sea.MAX_CARD_POPULAR: S.popular_matching(),
+                     sea.POP_AMONG_MAX_CARD: S.max_card_matching()}
+        st = S.matching_statistics(matchings)
+        for desc, M in matchings.items():
+            self.assertEqual(st.matchings[desc]['size'], matching_utils.matching_size(G, M))
+            self.assertEqual(st.matchings[desc]['bp'], S.blocking_pairs(M).count)
+            self.assertEqual(st.matchings[desc]['signature'], dict(sea.signature(G, M)))
+        for (desc, other), s in st.A.items():
+            M1, M2 = matchings[desc], matchings[other]
+            self.assertEqual(s['r_better'], count_residents(G, M1, M2, operator.lt))
+            self.assertEqual(s['r_equal'], count_residents(G, M1, M2, operator.eq))
+            self.assertEqual(s['r_worse'], count_residents(G, M1, M2, operator.gt))
+            self.assertEqual(s['r_better'], st.A[(other, desc)]['r_worse'])
+
+    def test_popularity_margins(self):
+        G = example_graph()
+        S = session.SolveSession(G)
+        matchings = [S.stable_matching(), S.popular_matching(), S.max_card_matching(),
+                     example_unstable_matching(), {}]
+        margins = S.popularity_margins(matchings)
+        for k, M1 in enumerate(matchings):
+            for l, M2 in enumerate(matchings):
+                votes = dict(graph.compare_matchings(G, M1, M2))
+                self.assertEqual(margins.residents[k, l], sum(votes[a] for a in G.A))
+                self.assertEqual(margins.hospitals[k, l], sum(votes[b] for b in G.B))
+        self.assertTrue((margins.total[:, 1] <= 0).all())
+        self.assertEqual(rank_arrays.rank_by_popularity(margins)[-1], 4)
+
+    def test_pairing_vote(self):
+        # 2 is paired with 3 rather than with 1
+        self.assertEqual(graph.pairing_vote([2], [1, 3]), 0)
+        self.assertEqual(graph.pairing_vote([1, 3], [2]), 2)
+        self.assertEqual(graph.pairing_vote([3], [1, 2]), -2)
+
+
+class TestExperimentRunner(unittest.TestCase):
+    def test_ordered_results(self):
+        jobs = [(0.2,), (0,), (0.01,), (2,)]
+        for workers in (1, 2):
+            results = list(jea_exp.run_jobs(slow_inverse, jobs, workers, timeout=0.5))
+            self.assertEqual([r.args for r in results], jobs)
+            self.assertEqual([r.value for r in results], [5, None, 100, None])
+            self.assertIn('ZeroDivisionError', results[1].error)
+            self.assertIn('JobTimeout', results[3].error)
+
+    def test_worker_exit(self):
+        jobs = [(0.01,), (0.2,), (-1,), (0,), (0.05,), (0.01,), (0,)]
+        results = list(jea_exp.run_jobs(exit_if_negative, jobs, 2))
+        self.assertEqual([r.args for r in results], jobs)
+        self.assertEqual([r.value for r in results], [0.01, 0.2, None, 0, 0.05, 0.01, 0])
+        self.assertIn('BrokenProcessPool', results[2].error)
+
+    def test_thread_timeout(self):
+        with self.assertRaises(ValueError):
+            list(jea_exp.run_jobs(slow_inverse, [(0,)], 2, timeout=1, threads=True))
+
+
+class TestStatsSink(unittest.TestCase):
+    def test_aggregate(self):
+        records = [{'dir': 'a', 'graph': 'g{}'.format(i), 'size': i, 'M': {'bp': 2 * i}} for i in range(5)]
+        records.append({'dir': 'b', 'graph': 'g', 'size': 7, 'M': {'bp': 1}})
+        with tempfile.TemporaryDirectory() as dirpath:
+            file_path = os.path.join(dirpath, 'stats.jsonl')
+            with stats.StatsSink(file_path, mode='w') as sink:
+                for record in records:
+                    sink.write(record)
+            self.assertEqual(list(stats.read_records(file_path)), records)
+            groups = stats.aggregate(stats.read_records(file_path), lambda record: record['dir'])
+        self.assertEqual(list(groups), ['a', 'b'])
+        self.assertEqual(groups['a']['size'].mean, 2)
+        self.assertAlmostEqual(groups['a']['size'].variance, 2.5)
+        self.assertEqual(groups['a']['M.bp'].quantile(0.5), 4)
+        self.assertEqual(groups['a']['M.bp'].quantile(0.25), 2)
+        self.assertEqual(groups['b']['size'].summary()['max'], 7)
+
+
+class TestReports(unittest.TestCase):
+    def test_directory_report(self):
+        G = example_graph()
+        S = session.SolveSession(G)
+        matchings = {sea.STABLE: S.stable_matching(), sea.MAX_CARD_POPULAR: S.popular_matching(),
+                     sea.POP_AMONG_MAX_CARD: S.max_card_matching()}
+        with tempfile.TemporaryDirectory() as dirpath:
+            os.mkdir(os.path.join(dirpath, 'a'))
+            for name in ('a/g1.txt', 'g2.txt'):
+                graph.write_graph_file(G, os.path.join(dirpath, name))
+                head, tail = os.path.split(os.path.join(dirpath, name))
+                for desc, M in matchings.items():
+                    matching_binary.write_matching(G, M, os.path.join(head, desc + tail))
+            reports = list(sea.directory_reports(dirpath))
+        self.assertEqual([name for name, _ in reports], ['g2.txt', 'a/g1.txt'])
+        tables = dict((t.title, t) for t in reports[0][1])
+        self.assertEqual(dict(tables['graph details'].rows)['n2'], {'': len(G.B)})
+        self.assertEqual(len(tables['A statistics'].rows), 6)
+        out = io.StringIO()
+        sea.write_csv_report(reports, out)
+        self.assertEqual(len(out.getvalue().splitlines()), 1 + 2 * (3 + 3 + 6))
+
+
+class TestStartup(unittest.TestCase):
+    def test_no_heavy_imports(self):
+        for module in startup_benchmark.CLI_MODULES:
+            self.assertEqual(startup_benchmark.heavy_imports(module), [], module)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -7,8 +7,8 @@ import matching_utils
 def make_graph(plistA, plistB):
     A = set(x[0] for x in plistA)
     B = set(x[0] for x in plistB)
-    capacities = dict((a, 1) for a in A)
-    capacities.update(dict((b, 1) for b in B))
+    capacities = dict((a, (0, 1)) for a in A)
+    capacities.update(dict((b, (0, 1)) for b in B))
     return graph.make_graph(A, B, plistA, plistB, capacities)
 
 